@@ -0,0 +1,387 @@
+# backend.py
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+# Documents fetched per Firestore page when streaming a query
+PAGE_SIZE = 500
+# Firestore accepts at most 30 values in one "in" filter
+MAX_IN_VALUES = 30
+
+
+class ServerTimestamp:
+    # Placeholder for the commit time, filled in by the backend
+    def __repr__(self):
+        return "SERVER_TIMESTAMP"
+
+
+SERVER_TIMESTAMP = ServerTimestamp()
+
+
+class ConflictError(Exception):
+    # A guarded update found the document changed or deleted since
+    pass
+
+
+# A backend stores the collections main.py works with. Filters are
+# (field, operator, value) tuples and writes are ("set" | "update" |
+# "delete", collection, doc_id, data) tuples, as used by the WriteQueue.
+# An "update" may carry the document's update_time as a fifth element,
+# it is then only applied if the document has not been written since.
+#
+#   get(collection, doc_id) -> data or None
+#   stream(collection, filters=(), order_by=None, fields=None) -> (doc_id, data)
+#   listen(collection, callback, filters=()) -> object with unsubscribe()
+#       callback(changes, read_time) gets ("ADDED" | "MODIFIED" | "REMOVED",
+#       doc_id, data, update_time) tuples, data and update_time are None for
+#       removals, the first call holds every matching document
+#   commit(writes) applies all writes or none, raises ConflictError when a
+#       guarded update fails
+#   transient_errors() -> exception types worth retrying a commit for
+
+
+class FirestoreBackend:
+    def __init__(self, client):
+        self.client = client
+
+    def transient_errors(self):
+        # google.api_core is slow to import, it is only needed once a commit fails
+        from google.api_core import exceptions
+
+        return (
+            exceptions.Aborted,
+            exceptions.DeadlineExceeded,
+            exceptions.InternalServerError,
+            exceptions.ServiceUnavailable,
+            exceptions.TooManyRequests,
+            exceptions.ResourceExhausted,
+            ConnectionError,
+        )
+
+    def query(self, collection, filters):
+        from firebase_admin import firestore
+
+        query = self.client.collection(collection)
+        for field, operator, value in filters:
+            query = query.where(filter=firestore.FieldFilter(field, operator, value))
+        return query
+
+    def get(self, collection, doc_id):
+        return self.client.collection(collection).document(doc_id).get().to_dict()
+
+    def stream(self, collection, filters=(), order_by=None, fields=None):
+        # Large "in" filters are split into several queries, every query is
+        # read a page at a time, continuing after the last document seen
+        filters = list(filters)
+        splits = [[]]
+        for index, (field, operator, value) in enumerate(filters):
+            if operator == "in" and len(value) > MAX_IN_VALUES:
+                value = list(value)
+                splits = [
+                    filters[:index]
+                    + [(field, "in", value[start : start + MAX_IN_VALUES])]
+                    + filters[index + 1 :]
+                    for start in range(0, len(value), MAX_IN_VALUES)
+                ]
+                break
+        if splits == [[]]:
+            splits = [filters]
+
+        for split in splits:
+            query = self.query(collection, split)
+            if order_by is not None:
+                query = query.order_by(order_by)
+            if fields is not None:
+                query = query.select(fields)
+            last = None
+            while True:
+                page = query.limit(PAGE_SIZE)
+                if last is not None:
+                    page = page.start_after(last)
+                count = 0
+                for last in page.stream():
+                    count += 1
+                    yield last.id, last.to_dict()
+                if count < PAGE_SIZE:
+                    break
+
+    def listen(self, collection, callback, filters=()):
+        def on_snapshot(snapshot, changes, read_time):
+            # Runs on the listener thread, only the data is copied out
+            batch = []
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    batch.append((change.type.name, doc.id, None, None))
+                else:
+                    batch.append(
+                        (change.type.name, doc.id, doc.to_dict(), doc.update_time)
+                    )
+            callback(batch, read_time)
+
+        return self.query(collection, filters).on_snapshot(on_snapshot)
+
+    def commit(self, writes):
+        from firebase_admin import firestore
+
+        batch = self.client.batch()
+        guarded = False
+        for operation, collection, doc_id, data, *update_time in writes:
+            ref = self.client.collection(collection).document(doc_id)
+            if data is not None:
+                data = {
+                    key: (
+                        firestore.SERVER_TIMESTAMP
+                        if value is SERVER_TIMESTAMP
+                        else value
+                    )
+                    for key, value in data.items()
+                }
+            if operation == "set":
+                batch.set(ref, data)
+            elif operation == "update" and update_time:
+                option = self.client.write_option(last_update_time=update_time[0])
+                batch.update(ref, data, option=option)
+                guarded = True
+            elif operation == "update":
+                batch.update(ref, data)
+            else:
+                batch.delete(ref)
+        try:
+            batch.commit()
+        except Exception as error:
+            from google.api_core import exceptions
+
+            # A deleted document fails the precondition as NotFound
+            conflicts = (exceptions.FailedPrecondition, exceptions.NotFound)
+            if guarded and isinstance(error, conflicts):
+                raise ConflictError(str(error)) from error
+            raise
+
+
+OPERATORS = {
+    "==": "=",
+    "!=": "!=",
+    "<": "<",
+    "<=": "<=",
+    ">": ">",
+    ">=": ">=",
+}
+
+
+COMPARISONS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+}
+
+
+def stored_value(value):
+    # Timestamps are kept as ISO text, which sorts and compares correctly
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def matches(data, filters):
+    for field, operator, value in filters:
+        if data is None or field not in data:
+            return False
+        current = stored_value(data[field])
+        if operator == "in":
+            value = [stored_value(v) for v in value]
+        else:
+            value = stored_value(value)
+        try:
+            if not COMPARISONS[operator](current, value):
+                return False
+        except TypeError:
+            # Firestore never matches values of different types
+            return False
+    return True
+
+
+class SqliteBackend:
+    # Local single-workstation database, no network involved. Listeners are
+    # called on the committing thread, like Firestore's listener threads.
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.listeners = {}  # collection -> list of (filters, callback)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, "
+                "update_time TEXT NOT NULL, "
+                "PRIMARY KEY (collection, id)) WITHOUT ROWID"
+            )
+            # Services and vehicles are looked up by their parent
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS documents_pripada ON documents "
+                "(collection, json_extract(data, '$.pripada'))"
+            )
+
+    def transient_errors(self):
+        # Raised while another connection holds the write lock
+        return (sqlite3.OperationalError,)
+
+    def where(self, filters):
+        # SQL condition and parameters for the filters, None if nothing matches
+        conditions = []
+        parameters = []
+        for field, operator, value in filters:
+            column = f"json_extract(data, '$.{field}')"
+            if operator == "in":
+                values = [stored_value(v) for v in value]
+                if not values:
+                    return None, None
+                conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+                parameters.extend(values)
+            else:
+                conditions.append(f"{column} {OPERATORS[operator]} ?")
+                parameters.append(stored_value(value))
+        return "".join(f" AND {condition}" for condition in conditions), parameters
+
+    def get(self, collection, doc_id):
+        return self.get_with_time(collection, doc_id)[0]
+
+    def get_with_time(self, collection, doc_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data, update_time FROM documents"
+                " WHERE collection = ? AND id = ?",
+                (collection, doc_id),
+            ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), datetime.fromisoformat(row[1])
+
+    def stream(self, collection, filters=(), order_by=None, fields=None):
+        where, parameters = self.where(filters)
+        if where is None:
+            return
+        key = "''"
+        if order_by is not None:
+            key = f"json_extract(data, '$.{order_by}')"
+            where += f" AND {key} IS NOT NULL"
+        query = f"SELECT id, data, {key} FROM documents WHERE collection = ?{where}"
+        order = f" ORDER BY {key}, id LIMIT {PAGE_SIZE}"
+        after = f" AND ({key} > ? OR ({key} = ? AND id > ?))"
+        # Read a page at a time, continuing after the last row, so the lock
+        # is not held while the caller works
+        rows = None
+        while rows is None or len(rows) == PAGE_SIZE:
+            with self.lock:
+                if rows is None:
+                    rows = self.connection.execute(
+                        query + order, [collection, *parameters]
+                    ).fetchall()
+                else:
+                    last_id, _, last_key = rows[-1]
+                    rows = self.connection.execute(
+                        query + after + order,
+                        [collection, *parameters, last_key, last_key, last_id],
+                    ).fetchall()
+            for doc_id, data, _ in rows:
+                yield doc_id, json.loads(data)
+
+    def listen(self, collection, callback, filters=()):
+        filters = list(filters)
+        listener = (filters, callback)
+        with self.lock:
+            self.listeners.setdefault(collection, []).append(listener)
+            where, parameters = self.where(filters)
+            rows = []
+            if where is not None:
+                rows = self.connection.execute(
+                    "SELECT id, data, update_time FROM documents"
+                    f" WHERE collection = ?{where}",
+                    [collection, *parameters],
+                ).fetchall()
+            read_time = datetime.now(timezone.utc)
+        callback(
+            [
+                ("ADDED", doc_id, json.loads(data), datetime.fromisoformat(update_time))
+                for doc_id, data, update_time in rows
+            ],
+            read_time,
+        )
+
+        def unsubscribe():
+            with self.lock:
+                self.listeners[collection].remove(listener)
+
+        return SimpleNamespace(unsubscribe=unsubscribe)
+
+    def commit(self, writes):
+        notifications = []
+        with self.lock:
+            commit_time = datetime.now(timezone.utc)
+            with self.connection:
+                for operation, collection, doc_id, data, *update_time in writes:
+                    old, old_update_time = self.get_with_time(collection, doc_id)
+                    if update_time and old_update_time != update_time[0]:
+                        raise ConflictError(
+                            f"Dokument {doc_id} je u međuvremenu izmenjen"
+                        )
+                    if operation == "delete":
+                        new = None
+                        self.connection.execute(
+                            "DELETE FROM documents WHERE collection = ? AND id = ?",
+                            (collection, doc_id),
+                        )
+                    else:
+                        if operation == "update":
+                            if old is None:
+                                raise LookupError(f"Dokument {doc_id} ne postoji")
+                            new = dict(old, **data)
+                        else:
+                            new = dict(data)
+                        new = {
+                            key: (
+                                commit_time.isoformat()
+                                if value is SERVER_TIMESTAMP
+                                else stored_value(value)
+                            )
+                            for key, value in new.items()
+                        }
+                        self.connection.execute(
+                            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)",
+                            (
+                                collection,
+                                doc_id,
+                                json.dumps(new, default=str),
+                                commit_time.isoformat(),
+                            ),
+                        )
+                    notifications.append((collection, doc_id, old, new))
+
+            # Every listener gets the changes of one commit in one call
+            batches = {}
+            for collection, doc_id, old, new in notifications:
+                for filters, callback in self.listeners.get(collection, ()):
+                    was, now = matches(old, filters), matches(new, filters)
+                    if now:
+                        change = (
+                            "MODIFIED" if was else "ADDED",
+                            doc_id,
+                            new,
+                            commit_time,
+                        )
+                    elif was:
+                        change = ("REMOVED", doc_id, None, None)
+                    else:
+                        continue
+                    batches.setdefault(callback, []).append(change)
+        for callback, changes in batches.items():
+            callback(changes, commit_time)
@@ -0,0 +1,326 @@
+# benchmarks/bench.py
+#
+# Offscreen benchmarks of the table hot paths against the in-memory
+# Firestore stand-in. Run from the repository root:
+#
+#     python -m benchmarks.bench [--sizes 1000 10000 100000] [--json out.json]
+#
+# Every operation runs twice on a fresh window: once timed, once under
+# tracemalloc for the peak of Python allocations (Qt's own C++ memory is
+# not included).
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="stefanpos-bench-")
+
+from PySide6.QtCore import QItemSelectionModel
+from PySide6.QtWidgets import QApplication
+
+import main
+from backend import FirestoreBackend
+from benchmarks.memorydb import MemoryClient
+
+SIZES = [1000, 10000, 100000]
+# Single document changes and filter calls per operation
+REPEATS = 100
+
+NAMES = ["Marko", "Jelena", "Nikola", "Ana", "Stefan", "Milica", "Đorđe", "Ivana"]
+SURNAMES = ["Petrović", "Jovanović", "Nikolić", "Marković", "Đorđević", "Ilić"]
+MODELS = ["Golf", "Astra", "Punto", "Octavia", "Clio", "Corolla"]
+
+
+def generate(size, seed=0):
+    # size customers with one vehicle each, and size services spread
+    # over a tenth of the vehicles so some have long histories
+    rng = random.Random(seed)
+    korisnici, vozila, servisi = {}, {}, {}
+    for i in range(size):
+        korisnici[f"k{i}"] = {
+            "ime": rng.choice(NAMES),
+            "prezime": rng.choice(SURNAMES),
+            "telefon": f"06{rng.randrange(10**8):08d}",
+        }
+        vozila[f"v{i}"] = {
+            "pripada": f"k{i}",
+            "model": rng.choice(MODELS),
+            "vrsta": "putničko",
+            "sasija": f"WVW{rng.randrange(10**10):010d}",
+            "motor": f"M{i}",
+            "tablice": f"BG{rng.randrange(1000, 9999)}{rng.choice('ABCDEF')}",
+            "godiste": rng.randrange(1990, 2025),
+            "snaga": rng.randrange(40, 200),
+            "kubikaza": rng.choice([1200, 1400, 1600, 1900, 2000]),
+        }
+    for i in range(size):
+        servisi[f"s{i}"] = {
+            "pripada": f"v{rng.randrange(max(size // 10, 1))}",
+            "detalji": "Zamena ulja i filtera",
+            "kilometraza": rng.randrange(300000),
+            "cena": float(rng.randrange(1000, 50000)),
+            "datum": f"{rng.randrange(2015, 2025)}-{rng.randrange(1, 13):02d}-01",
+            "vreme": "10:00:00",
+        }
+    return {"korisnici": korisnici, "vozila": vozila, "servisi": servisi}
+
+
+def process_events():
+    QApplication.processEvents()
+
+
+def load_cache(window):
+    window.load_cache()
+    while not window.cache_loaded:
+        process_events()
+
+
+def open_window(db):
+    window = main.MainWindow()
+    load_cache(window)
+    window.on_connected(FirestoreBackend(db))
+    process_events()
+    return window
+
+
+def close_window(window):
+    window.close()
+    window.cache.close()
+    window.deleteLater()
+    process_events()
+
+
+def remove_cache():
+    if os.path.exists(main.CACHE_PATH):
+        os.remove(main.CACHE_PATH)
+
+
+class Bench:
+    def __init__(self, size):
+        self.size = size
+        self.data = generate(size)
+
+    def client(self):
+        db = MemoryClient()
+        for collection, documents in self.data.items():
+            db.seed(collection, documents)
+        return db
+
+    # Each operation returns a setup function that builds its state and a
+    # run function that does the measured work on it
+
+    def load(self):
+        # Listener snapshots of every document into an empty window
+        def setup():
+            remove_cache()
+            window = main.MainWindow()
+            load_cache(window)
+            return self.client(), window
+
+        def run(state):
+            db, window = state
+            window.on_connected(FirestoreBackend(db))
+            process_events()
+            return window
+
+        return setup, run
+
+    def warm_start(self):
+        # Window construction and applying a filled snapshot cache
+        def setup():
+            remove_cache()
+            close_window(open_window(self.client()))
+
+        def run(state):
+            window = main.MainWindow()
+            load_cache(window)
+            return window
+
+        return setup, run
+
+    def add_row(self):
+        def setup():
+            remove_cache()
+            db = self.client()
+            return db, open_window(db)
+
+        def run(state):
+            db, window = state
+            collection = db.collection("korisnici")
+            for i in range(REPEATS):
+                collection.document(f"new{i}").set(
+                    {"ime": "Novi", "prezime": "Korisnik", "telefon": str(i)}
+                )
+                process_events()
+            return window
+
+        return setup, run
+
+    def update_row(self):
+        def setup():
+            remove_cache()
+            db = self.client()
+            return db, open_window(db)
+
+        def run(state):
+            db, window = state
+            collection = db.collection("vozila")
+            for i in range(REPEATS):
+                collection.document(f"v{i * self.size // REPEATS}").update(
+                    {"tablice": f"NS{i}"}
+                )
+                process_events()
+            return window
+
+        return setup, run
+
+    def remove_row(self):
+        def setup():
+            remove_cache()
+            db = self.client()
+            return db, open_window(db)
+
+        def run(state):
+            db, window = state
+            collection = db.collection("servisi")
+            for i in range(REPEATS):
+                collection.document(f"s{i * self.size // REPEATS}").delete()
+                process_events()
+            return window
+
+        return setup, run
+
+    def filter_korisnici(self):
+        queries = ["mar", "petrović", "06", "ana il", "nikola nikolić", ""]
+
+        def setup():
+            remove_cache()
+            db = self.client()
+            return db, open_window(db)
+
+        def run(state):
+            db, window = state
+            for i in range(REPEATS):
+                window.ui.lineEdit_pretraga.setText(queries[i % len(queries)])
+                window.filter_korisnici()
+                process_events()
+            return window
+
+        return setup, run
+
+    def filter_servisi_by_vozilo(self):
+        def setup():
+            remove_cache()
+            db = self.client()
+            return db, open_window(db)
+
+        def run(state):
+            db, window = state
+            view = window.ui.tableView_vozila
+            selection = view.selectionModel()
+            rows = view.model().rowCount()
+            for i in range(REPEATS):
+                index = view.model().index(i * rows // REPEATS, 0)
+                selection.select(
+                    index,
+                    QItemSelectionModel.ClearAndSelect | QItemSelectionModel.Rows,
+                )
+                process_events()
+            return window
+
+        return setup, run
+
+    def report(self):
+        # First report builds the arrays, the rest only query them
+        def setup():
+            remove_cache()
+            db = self.client()
+            return db, open_window(db)
+
+        def run(state):
+            db, window = state
+            window.report_from.setDate(window.report_from.date().addYears(-20))
+            for i in range(REPEATS // 10):
+                window.report_period.setCurrentIndex(i % 3)
+                window.show_report()
+            return window
+
+        return setup, run
+
+
+OPERATIONS = [
+    "load",
+    "warm_start",
+    "add_row",
+    "update_row",
+    "remove_row",
+    "filter_korisnici",
+    "filter_servisi_by_vozilo",
+    "report",
+]
+
+
+def measure(setup, run, trace):
+    state = setup()
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+    began = time.perf_counter()
+    window = run(state)
+    elapsed = time.perf_counter() - began
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1] - start
+        tracemalloc.stop()
+    close_window(window)
+    return elapsed, peak
+
+
+def run_benchmarks(sizes, operations):
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    print(f"{'size':>8}  {'operation':<26} {'wall ms':>10} {'peak MiB':>10}")
+    for size in sizes:
+        bench = Bench(size)
+        for name in operations:
+            setup, run = getattr(bench, name)()
+            elapsed, _ = measure(setup, run, trace=False)
+            _, peak = measure(setup, run, trace=True)
+            results.append(
+                {
+                    "size": size,
+                    "operation": name,
+                    "wall_ms": round(elapsed * 1000, 2),
+                    "peak_bytes": peak,
+                }
+            )
+            print(
+                f"{size:>8}  {name:<26} {elapsed * 1000:>10.1f}"
+                f" {peak / 2**20:>10.2f}",
+                flush=True,
+            )
+    app.processEvents()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument(
+        "--operations", nargs="+", default=OPERATIONS, choices=OPERATIONS
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.operations)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=4)
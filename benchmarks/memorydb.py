@@ -0,0 +1,269 @@
+# benchmarks/memorydb.py
+import operator
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
+
+from workers import new_id
+
+# In-memory stand-in for the part of the Firestore client FirestoreBackend
+# uses: collection/document references, where/order_by/limit/start_after/select
+# queries, batches with last_update_time preconditions and on_snapshot
+# listeners. Listeners are called
+# synchronously on the writing thread, with every change of one commit in
+# a single snapshot, the way Firestore groups them.
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, values: value in values,
+}
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+class DocumentSnapshot:
+    def __init__(self, doc_id, data, update_time=None):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self):
+        return None if self._data is None else dict(self._data)
+
+
+class DocumentChange:
+    def __init__(self, change_type, document):
+        self.type = SimpleNamespace(name=change_type)
+        self.document = document
+
+
+class DocumentReference:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self):
+        with self.collection.db.lock:
+            data = self.collection.documents.get(self.id)
+            update_time = self.collection.update_times.get(self.id)
+        return DocumentSnapshot(self.id, data, update_time)
+
+    def set(self, data):
+        self.collection.db.commit([("set", self, data, None)])
+
+    def update(self, data):
+        self.collection.db.commit([("update", self, data, None)])
+
+    def delete(self):
+        self.collection.db.commit([("delete", self, None, None)])
+
+
+class Query:
+    def __init__(self, collection, filters=(), orders=(), count=None, after=None):
+        self.collection = collection
+        self.filters = filters
+        self.orders = orders
+        self.count = count
+        self.after = after
+
+    def _copy(self, **changes):
+        values = {
+            "filters": self.filters,
+            "orders": self.orders,
+            "count": self.count,
+            "after": self.after,
+        }
+        values.update(changes)
+        return Query(self.collection, **values)
+
+    def where(self, filter):
+        return self._copy(filters=self.filters + (filter,))
+
+    def order_by(self, field):
+        return self._copy(orders=self.orders + (field,))
+
+    def limit(self, count):
+        return self._copy(count=count)
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot)
+
+    def select(self, fields):
+        return self
+
+    def matches(self, data):
+        return data is not None and all(
+            f.field_path in data and OPERATORS[f.op_string](data[f.field_path], f.value)
+            for f in self.filters
+        )
+
+    def _key(self, doc_id, data):
+        return tuple(str(data.get(field, "")) for field in self.orders) + (doc_id,)
+
+    def stream(self):
+        with self.collection.db.lock:
+            items = [
+                (doc_id, data, self.collection.update_times[doc_id])
+                for doc_id, data in self.collection.documents.items()
+                if self.matches(data)
+            ]
+        items.sort(key=lambda item: self._key(item[0], item[1]))
+        if self.after is not None:
+            after = self._key(self.after.id, self.after.to_dict())
+            items = [item for item in items if self._key(item[0], item[1]) > after]
+        if self.count is not None:
+            items = items[: self.count]
+        return [DocumentSnapshot(*item) for item in items]
+
+    def get(self):
+        return self.stream()
+
+    def on_snapshot(self, callback):
+        with self.collection.db.lock:
+            changes = [
+                DocumentChange(
+                    "ADDED",
+                    DocumentSnapshot(
+                        doc_id, data, self.collection.update_times[doc_id]
+                    ),
+                )
+                for doc_id, data in self.collection.documents.items()
+                if self.matches(data)
+            ]
+            listener = (self, callback)
+            self.collection.listeners.append(listener)
+        callback([change.document for change in changes], changes, now())
+
+        def unsubscribe():
+            with self.collection.db.lock:
+                self.collection.listeners.remove(listener)
+
+        return SimpleNamespace(unsubscribe=unsubscribe)
+
+
+class CollectionReference(Query):
+    def __init__(self, db, name):
+        super().__init__(self)
+        self.db = db
+        self.name = name
+        self.documents = {}
+        self.update_times = {}
+        self.listeners = []
+
+    def document(self, doc_id=None):
+        return DocumentReference(self, doc_id or new_id())
+
+    def add(self, data):
+        reference = self.document()
+        reference.set(data)
+        return now(), reference
+
+
+class WriteBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, reference, data):
+        self.writes.append(("set", reference, data, None))
+
+    def update(self, reference, data, option=None):
+        self.writes.append(("update", reference, data, option))
+
+    def delete(self, reference):
+        self.writes.append(("delete", reference, None, None))
+
+    def commit(self):
+        self.db.commit(self.writes)
+        self.writes = []
+
+
+class MemoryClient:
+    def __init__(self):
+        self.collections = {}
+        self.lock = threading.RLock()
+        self.writes = 0
+
+    def collection(self, name):
+        with self.lock:
+            if name not in self.collections:
+                self.collections[name] = CollectionReference(self, name)
+            return self.collections[name]
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def write_option(self, last_update_time):
+        return SimpleNamespace(last_update_time=last_update_time)
+
+    def commit(self, writes):
+        # Applies the writes atomically, then notifies every listener once
+        notifications = {}
+        with self.lock:
+            for operation, reference, data, option in writes:
+                update_time = reference.collection.update_times.get(reference.id)
+                if option is not None and update_time != option.last_update_time:
+                    raise FailedPrecondition(f"Document changed: {reference.id}")
+                if operation == "update" and update_time is None:
+                    raise NotFound(f"No document to update: {reference.id}")
+            commit_time = now()
+            for operation, reference, data, _ in writes:
+                collection = reference.collection
+                old = collection.documents.get(reference.id)
+                if operation == "delete":
+                    new = None
+                elif operation == "update":
+                    new = dict(old, **data)
+                else:
+                    new = dict(data)
+                if new is None:
+                    collection.documents.pop(reference.id, None)
+                    collection.update_times.pop(reference.id, None)
+                else:
+                    new = {
+                        key: (
+                            commit_time
+                            if value is firestore.SERVER_TIMESTAMP
+                            else value
+                        )
+                        for key, value in new.items()
+                    }
+                    collection.documents[reference.id] = new
+                    collection.update_times[reference.id] = commit_time
+
+                for query, callback in collection.listeners:
+                    was, matches = query.matches(old), query.matches(new)
+                    if matches:
+                        change_type = "MODIFIED" if was else "ADDED"
+                        document = DocumentSnapshot(reference.id, new, commit_time)
+                    elif was:
+                        change_type = "REMOVED"
+                        document = DocumentSnapshot(reference.id, old)
+                    else:
+                        continue
+                    notifications.setdefault(callback, []).append(
+                        DocumentChange(change_type, document)
+                    )
+            self.writes += len(writes)
+        for callback, changes in notifications.items():
+            callback([change.document for change in changes], changes, commit_time)
+
+    def seed(self, collection, documents):
+        # Loads documents without notifying listeners, for setting up a run
+        collection = self.collection(collection)
+        with self.lock:
+            commit_time = now()
+            for doc_id, data in documents.items():
+                collection.documents[doc_id] = data
+                collection.update_times[doc_id] = commit_time
@@ -0,0 +1,105 @@
+# cache.py
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+
+def stored_time(value):
+    return None if value is None else value.isoformat()
+
+
+class SnapshotCache:
+    # Local SQLite copy of the listened collections, used to render the
+    # tables before Firestore answers and to listen only for newer changes
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            # Readers like the export thread then never block saves
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, "
+                "update_time TEXT, "
+                "PRIMARY KEY (collection, id)) WITHOUT ROWID"
+            )
+            # Caches written before update_time was kept get the column empty
+            columns = [
+                row[1]
+                for row in self.connection.execute("PRAGMA table_info(documents)")
+            ]
+            if "update_time" not in columns:
+                self.connection.execute(
+                    "ALTER TABLE documents ADD COLUMN update_time TEXT"
+                )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS read_times ("
+                "collection TEXT PRIMARY KEY, read_time TEXT NOT NULL)"
+            )
+
+    def load(self, collection, size):
+        # Yields (documents, update_times where known) size documents at a
+        # time. The rows are fetched up front and decoded a chunk at a time,
+        # so saves in between never meet an open read.
+        rows = self.connection.execute(
+            "SELECT id, data, update_time FROM documents WHERE collection = ?",
+            (collection,),
+        ).fetchall()
+        for start in range(0, len(rows), size):
+            documents = {}
+            update_times = {}
+            for doc_id, data, update_time in rows[start : start + size]:
+                documents[doc_id] = json.loads(data)
+                if update_time is not None:
+                    update_times[doc_id] = datetime.fromisoformat(update_time)
+            yield documents, update_times
+
+    def read_time(self, collection):
+        row = self.connection.execute(
+            "SELECT read_time FROM read_times WHERE collection = ?", (collection,)
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def iterate(self, collection, start=None, end=None):
+        # Yields (doc_id, data) one row at a time, optionally only documents
+        # whose ISO "datum" falls within [start, end]
+        query = "SELECT id, data FROM documents WHERE collection = ?"
+        parameters = [collection]
+        if start is not None:
+            query += " AND json_extract(data, '$.datum') >= ?"
+            parameters.append(start)
+        if end is not None:
+            query += " AND json_extract(data, '$.datum') <= ?"
+            parameters.append(end)
+        for doc_id, data in self.connection.execute(query, parameters):
+            yield doc_id, json.loads(data)
+
+    def save(self, collection, documents, removals, read_time=None, update_times=None):
+        update_times = update_times or {}
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM documents WHERE collection = ? AND id = ?",
+                ((collection, doc_id) for doc_id in removals),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)",
+                (
+                    (
+                        collection,
+                        doc_id,
+                        json.dumps(data, default=str),
+                        stored_time(update_times.get(doc_id)),
+                    )
+                    for doc_id, data in documents.items()
+                ),
+            )
+            if read_time is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO read_times VALUES (?, ?)",
+                    (collection, read_time.isoformat()),
+                )
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,128 @@
+# exporter.py
+import csv
+import os
+import threading
+
+from PySide6.QtCore import QObject, Signal
+
+from cache import SnapshotCache
+
+# Rows written between progress updates
+PROGRESS_ROWS = 500
+
+COLUMNS = [
+    ("id", "ID"),
+    ("vozilo", "Vozilo"),
+    ("vlasnik", "Vlasnik"),
+    ("detalji", "Detalji"),
+    ("kilometraza", "Kilometraža"),
+    ("cena", "Cena"),
+    ("datum", "Datum"),
+    ("vreme", "Vreme"),
+]
+
+
+class Exporter(QObject):
+    # Writes services to a CSV file on a background thread. Rows are read
+    # from the local cache when it holds the whole collection, otherwise
+    # streamed from the backend, and written as they arrive.
+    progress = Signal(int)  # rows written so far
+    finished = Signal(int)
+    failed = Signal(str)
+
+    def __init__(
+        self,
+        db,
+        path,
+        labels,
+        date_from=None,
+        date_to=None,
+        vozila=None,
+        cache_path=None,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.db = db
+        self.path = path
+        self.labels = labels  # vehicle ID -> (vehicle, owner)
+        self.date_from = date_from  # ISO dates, both inclusive
+        self.date_to = date_to
+        self.vozila = None if vozila is None else set(vozila)
+        self.cache_path = cache_path
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping = True
+
+    def in_range(self, data):
+        datum = str(data.get("datum", ""))
+        if self.date_from is not None and datum < self.date_from:
+            return False
+        return self.date_to is None or datum <= self.date_to
+
+    def documents(self):
+        if self.cache_path is not None:
+            # SQLite connections are per thread, so the cache is opened here
+            cache = SnapshotCache(self.cache_path)
+            try:
+                for doc_id, data in cache.iterate(
+                    "servisi", self.date_from, self.date_to
+                ):
+                    if self.vozila is None or data.get("pripada") in self.vozila:
+                        yield doc_id, data
+            finally:
+                cache.close()
+            return
+
+        if self.vozila is None:
+            filters = []
+            if self.date_from is not None:
+                filters.append(("datum", ">=", self.date_from))
+            if self.date_to is not None:
+                filters.append(("datum", "<=", self.date_to))
+            yield from self.db.stream("servisi", filters, order_by="datum")
+            return
+
+        # Per vehicle equality queries need no composite index, the date
+        # range is applied here instead
+        for vozilo_id in sorted(self.vozila):
+            for doc_id, data in self.db.stream(
+                "servisi", [("pripada", "==", vozilo_id)]
+            ):
+                if self.in_range(data):
+                    yield doc_id, data
+
+    def _run(self):
+        temporary = self.path + ".tmp"
+        try:
+            count = self._export(temporary)
+            if self.stopping:
+                os.remove(temporary)
+                return
+            os.replace(temporary, self.path)
+        except Exception as error:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            self.failed.emit(str(error))
+            return
+        self.finished.emit(count)
+
+    def _export(self, path):
+        count = 0
+        with open(path, "w", encoding="utf-8-sig", newline="") as file:
+            writer = csv.writer(file, delimiter=";")
+            writer.writerow([header for _, header in COLUMNS])
+            for doc_id, data in self.documents():
+                if self.stopping:
+                    break
+                vozilo, vlasnik = self.labels.get(data.get("pripada"), ("", ""))
+                row = dict(data, id=doc_id, vozilo=vozilo, vlasnik=vlasnik)
+                writer.writerow([row.get(field, "") for field, _ in COLUMNS])
+                count += 1
+                if count % PROGRESS_ROWS == 0:
+                    self.progress.emit(count)
+        return count
@@ -0,0 +1,276 @@
+# importer.py
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+from PySide6.QtCore import QObject, Signal
+
+from settings import save_json
+from workers import MAX_BATCH_WRITES, commit_batch
+
+# Bytes read from a JSON file at a time
+READ_CHUNK = 1 << 16
+
+# Column of the parent document used to resolve "pripada" when the file
+# does not carry document IDs: owners by phone, vehicles by chassis number
+LINK_FIELDS = {"vozila": "telefon", "servisi": "sasija"}
+
+CONVERTERS = {"kilometraza": int, "cena": float}
+
+
+def normalize_column(name):
+    name = unicodedata.normalize("NFKD", str(name).replace("đ", "dj"))
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return "".join(name.lower().split())
+
+
+def normalize_link(field, value):
+    value = str(value or "")
+    if field == "telefon":
+        return re.sub(r"\D", "", value)
+    return "".join(value.upper().split())
+
+
+def map_columns(columns, fields, aliases):
+    # Maps file columns onto field names, by field name or a header label
+    names = {normalize_column(field): field for field in fields}
+    for alias, field in aliases.items():
+        if field in fields:
+            names.setdefault(normalize_column(alias), field)
+    return {
+        column: names[normalize_column(column)]
+        for column in columns
+        if normalize_column(column) in names
+    }
+
+
+def read_csv(file):
+    # The exporter and Excel in a Serbian locale separate columns with ";"
+    sample = file.read(READ_CHUNK)
+    file.seek(0)
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+    except csv.Error:
+        delimiter = ","
+    yield from csv.DictReader(file, delimiter=delimiter)
+
+
+def read_json(file):
+    # Streams the objects of a JSON array, or of JSON Lines, without
+    # loading the whole file
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer, position = file.read(READ_CHUNK), 0
+            eof = not buffer
+            continue
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield record
+
+
+def read_records(path, file):
+    if os.path.splitext(path)[1].lower() == ".csv":
+        return read_csv(file)
+    return read_json(file)
+
+
+class CheckpointStore:
+    # Records how far each file got, so an interrupted import resumes
+    # after the last committed batch
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r") as file:
+            return json.load(file)
+
+    def get(self, key, signature):
+        with self.lock:
+            checkpoint = self.load().get(key)
+        if checkpoint and checkpoint["signature"] == signature:
+            return checkpoint["done"]
+        return 0
+
+    def set(self, key, signature, done):
+        with self.lock:
+            checkpoints = self.load()
+            if done is None:
+                checkpoints.pop(key, None)
+            else:
+                checkpoints[key] = {"signature": signature, "done": done}
+            save_json(self.path, checkpoints)
+
+
+class Importer(QObject):
+    # Imports one CSV or JSON file into a collection on a background thread,
+    # committing a batch at a time. Document IDs are derived from the file
+    # and record number, so a batch replayed after a crash is overwritten.
+    progress = Signal(int)  # records read so far
+    finished = Signal(int, int)  # imported, skipped
+    failed = Signal(str)
+
+    def __init__(
+        self,
+        db,
+        path,
+        collection,
+        fields,
+        aliases,
+        checkpoints,
+        parents=None,
+        extra=None,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.db = db
+        self.path = os.path.abspath(path)
+        self.collection = collection
+        self.fields = list(fields)
+        self.aliases = aliases
+        self.checkpoints = checkpoints
+        self.extra = extra or {}
+        self.stopping = False
+
+        # Built on the calling thread, the parents' store keeps changing
+        self.link_field = LINK_FIELDS.get(collection)
+        self.parent_ids = set(parents or ())
+        self.links = {}
+        if self.link_field:
+            for doc_id, data in (parents or {}).items():
+                key = normalize_link(self.link_field, data.get(self.link_field))
+                if key:
+                    self.links.setdefault(key, doc_id)
+
+        stat = os.stat(self.path)
+        self.signature = [stat.st_size, stat.st_mtime_ns]
+        self.key = f"{collection}:{self.path}"
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        # The checkpoint keeps the committed part, the rest resumes later
+        self.stopping = True
+
+    def doc_id(self, number):
+        key = f"{self.path}:{self.signature}:{number}"
+        return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+    def convert(self, record, columns):
+        # None for records without a value in any mapped field
+        data = {}
+        empty = True
+        for column, field in columns.items():
+            value = record.get(column)
+            value = "" if value is None else value
+            if field in self.fields and field != "pripada":
+                empty = empty and not str(value).strip()
+            if field in CONVERTERS:
+                value = CONVERTERS[field](value) if str(value).strip() else 0
+            data[field] = value
+        if empty:
+            return None
+
+        if self.link_field:
+            value = data.pop(self.link_field + "_link", None)
+            pripada = data.get("pripada")
+            if pripada not in self.parent_ids:
+                key = normalize_link(self.link_field, pripada or value)
+                pripada = self.links.get(key)
+            if pripada is None:
+                return None
+            data["pripada"] = pripada
+        return data
+
+    def _run(self):
+        try:
+            imported, skipped = self._import()
+        except Exception as error:
+            self.failed.emit(str(error))
+            return
+        if not self.stopping:
+            self.finished.emit(imported, skipped)
+
+    def _import(self):
+        done = self.checkpoints.get(self.key, self.signature)
+        imported = skipped = 0
+        writes = []
+        number = 0
+        with open(self.path, "r", encoding="utf-8-sig", newline="") as file:
+            keys = columns = None
+            for number, record in enumerate(read_records(self.path, file), 1):
+                if self.stopping:
+                    return imported, skipped
+                if number <= done:
+                    continue
+                data = None
+                if isinstance(record, dict):
+                    # JSON records may differ in their keys, CSV rows never do
+                    if keys != record.keys():
+                        first = keys is None
+                        keys, columns = record.keys(), self.columns(record)
+                        if first and not any(
+                            field in self.fields for field in columns.values()
+                        ):
+                            raise ValueError(
+                                "Nijedna kolona fajla ne odgovara poljima"
+                                f" kolekcije {self.collection}: {', '.join(keys)}"
+                            )
+                    try:
+                        data = self.convert(record, columns)
+                    except (TypeError, ValueError):
+                        pass
+                if data is None:
+                    skipped += 1
+                else:
+                    data.update(self.extra)
+                    writes.append(("set", self.collection, self.doc_id(number), data))
+
+                if len(writes) == MAX_BATCH_WRITES:
+                    imported += self._commit(writes, number)
+                    writes = []
+                if number % MAX_BATCH_WRITES == 0:
+                    self.progress.emit(number)
+        imported += self._commit(writes, number)
+        self.checkpoints.set(self.key, self.signature, None)
+        self.progress.emit(number)
+        return imported, skipped
+
+    def columns(self, record):
+        columns = map_columns(record, self.fields, self.aliases)
+        if self.link_field:
+            # The parent's key column, e.g. the owner's phone for a vehicle
+            for column in record:
+                if normalize_column(column) == self.link_field:
+                    columns.setdefault(column, self.link_field + "_link")
+        return columns
+
+    def _commit(self, writes, number):
+        if writes:
+            commit_batch(self.db, writes)
+        self.checkpoints.set(self.key, self.signature, number)
+        return len(writes)
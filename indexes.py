@@ -0,0 +1,346 @@
+# indexes.py
+import unicodedata
+
+# Longest n-gram stored per text, queries longer than this are verified
+GRAM_SIZE = 3
+
+# Serbian Cyrillic to Latin, then the Latin letters folded to plain ASCII,
+# so "Ђорђевић", "Đorđević" and "Djordjevic" are the same text
+CYRILLIC = str.maketrans(
+    dict(
+        zip(
+            "абвгдђежзијклмнопрстћуфхцчш",
+            "abvgdđežzijklmnoprstćufhcčš",
+        ),
+        љ="lj",
+        њ="nj",
+        џ="dž",
+    )
+)
+LATIN = str.maketrans({"đ": "dj", "č": "c", "ć": "c", "š": "s", "ž": "z"})
+
+
+def normalize(value):
+    return " ".join(str(value).lower().split())
+
+
+def fold(value):
+    text = normalize(value).translate(CYRILLIC).translate(LATIN)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char))
+    return text
+
+
+def grams(text):
+    keys = set()
+    for size in range(1, GRAM_SIZE + 1):
+        for start in range(len(text) - size + 1):
+            keys.add(text[start : start + size])
+    return keys
+
+
+def word_grams(word):
+    # Trigrams of the word padded with a space on both sides
+    word = f" {word} "
+    return {word[start : start + 3] for start in range(len(word) - 2)}
+
+
+def max_distance(word):
+    # Typos tolerated in a query word, none for the first few letters typed
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def distance(a, b, limit):
+    # Levenshtein distance, anything above limit is reported as limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char != other),
+                )
+            )
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+class SearchIndex:
+    # Search over a few fields of folded text. Substrings are found through
+    # an n-gram -> doc_ids index. Misspelt words are found through a trigram
+    # index over the distinct words, whose size follows the vocabulary, not
+    # the number of documents.
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.texts = {}  # doc_id -> folded field values
+        self.postings = {}  # n-gram -> set of doc_ids
+        self.words = {}  # word -> set of doc_ids
+        self.word_grams = {}  # padded trigram -> set of words
+
+    def update(self, doc_id, data):
+        texts = tuple(fold(data.get(field, "")) for field in self.fields)
+        if self.texts.get(doc_id) == texts:
+            return
+        self.remove(doc_id)
+        self.texts[doc_id] = texts
+        for key in set().union(*(grams(text) for text in texts)):
+            self.postings.setdefault(key, set()).add(doc_id)
+        for word in {word for text in texts for word in text.split()}:
+            doc_ids = self.words.get(word)
+            if doc_ids is None:
+                doc_ids = self.words[word] = set()
+                # Only words made of letters are matched with typos
+                if word.isalpha():
+                    for key in word_grams(word):
+                        self.word_grams.setdefault(key, set()).add(word)
+            doc_ids.add(doc_id)
+
+    def remove(self, doc_id):
+        texts = self.texts.pop(doc_id, None)
+        if texts is None:
+            return
+        for key in set().union(*(grams(text) for text in texts)):
+            doc_ids = self.postings.get(key)
+            if doc_ids is not None:
+                doc_ids.discard(doc_id)
+                if not doc_ids:
+                    del self.postings[key]
+        for word in {word for text in texts for word in text.split()}:
+            doc_ids = self.words[word]
+            doc_ids.discard(doc_id)
+            if doc_ids:
+                continue
+            del self.words[word]
+            if word.isalpha():
+                for key in word_grams(word):
+                    similar = self.word_grams[key]
+                    similar.discard(word)
+                    if not similar:
+                        del self.word_grams[key]
+
+    def substring(self, query):
+        # Documents with a field containing the folded query
+        if len(query) <= GRAM_SIZE:
+            return set(self.postings.get(query, ()))
+
+        keys = {
+            query[start : start + GRAM_SIZE]
+            for start in range(len(query) - GRAM_SIZE + 1)
+        }
+        candidates = sorted((self.postings.get(key, set()) for key in keys), key=len)
+        if not candidates[0]:
+            return set()
+        doc_ids = candidates[0].intersection(*candidates[1:])
+        return {
+            doc_id
+            for doc_id in doc_ids
+            if any(query in text for text in self.texts[doc_id])
+        }
+
+    def similar(self, word):
+        # Indexed words within max_distance(word) edits -> their distance
+        limit = max_distance(word)
+        if not limit or not word.isalpha():
+            return {}
+        keys = word_grams(word)
+        shared = {}
+        for key in keys:
+            for candidate in self.word_grams.get(key, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        # One edit changes at most three of the padded trigrams
+        needed = len(keys) - 3 * limit
+        result = {}
+        for candidate, count in shared.items():
+            if count >= needed:
+                edits = distance(word, candidate, limit)
+                if edits <= limit:
+                    result[candidate] = edits
+        return result
+
+    def search(self, query):
+        # Returns None for an empty query, meaning "everything matches",
+        # otherwise the matching IDs -> rank, lower is better. Every query
+        # word has to match a substring or, with a few typos, a whole word.
+        # Documents holding the whole query, across their fields in order,
+        # rank first, then those with the fewest typos.
+        query = fold(query)
+        if not query:
+            return None
+
+        scores = None
+        for word in query.split():
+            matches = dict.fromkeys(self.substring(word), 0)
+            for candidate, edits in self.similar(word).items():
+                for doc_id in self.words[candidate]:
+                    if matches.get(doc_id, edits) >= edits:
+                        matches[doc_id] = edits
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    doc_id: score + matches[doc_id]
+                    for doc_id, score in scores.items()
+                    if doc_id in matches
+                }
+        if " " in query:
+            for doc_id in scores:
+                if query in " ".join(self.texts[doc_id]):
+                    scores[doc_id] = -1
+        return scores
+
+
+class FieldIndex:
+    # Exact-match index from the value of one field to the IDs holding it.
+    # Sets handed out by get() stay live, so filters follow later updates.
+
+    def __init__(self, field):
+        self.field = field
+        self.values = {}  # doc_id -> indexed value
+        self.doc_ids = {}  # value -> set of doc_ids
+
+    def update(self, doc_id, data):
+        # Returns True when an already indexed document moved to another value
+        value = data.get(self.field)
+        moved = doc_id in self.values
+        if moved:
+            if self.values[doc_id] == value:
+                return False
+            self.remove(doc_id)
+        self.values[doc_id] = value
+        self.doc_ids.setdefault(value, set()).add(doc_id)
+        return moved
+
+    def remove(self, doc_id):
+        if doc_id in self.values:
+            self.doc_ids[self.values.pop(doc_id)].discard(doc_id)
+
+    def get(self, value):
+        return self.doc_ids.setdefault(value, set())
+
+
+def normalize_key(value):
+    # Plates and chassis numbers match regardless of case, spaces, dashes or dots
+    return "".join(char for char in str(value).upper() if char.isalnum())
+
+
+class KeyIndex:
+    # Exact-match index from the normalized values of a few fields to the
+    # IDs holding them, a lookup is one dict access
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.keys = {}  # doc_id -> normalized values
+        self.doc_ids = {}  # normalized value -> set of doc_ids
+
+    def update(self, doc_id, data):
+        keys = {normalize_key(data.get(field, "")) for field in self.fields} - {""}
+        if self.keys.get(doc_id) == keys:
+            return
+        self.remove(doc_id)
+        self.keys[doc_id] = keys
+        for key in keys:
+            self.doc_ids.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        for key in self.keys.pop(doc_id, ()):
+            doc_ids = self.doc_ids[key]
+            doc_ids.discard(doc_id)
+            if not doc_ids:
+                del self.doc_ids[key]
+
+    def get(self, value):
+        return set(self.doc_ids.get(normalize_key(value), ()))
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Totals:
+    # Running totals of one vehicle's services. Sums and counts follow every
+    # change directly, the maximums are only recomputed from this vehicle's
+    # services when the current maximum goes away.
+
+    def __init__(self):
+        self.members = {}  # doc_id -> (cena, kilometraza, datum)
+        self.count = 0
+        self.cena = 0.0
+        self.kilometraza = 0.0
+        self.datum = ""
+
+    def add(self, doc_id, values):
+        cena, kilometraza, datum = values
+        self.members[doc_id] = values
+        self.count += 1
+        self.cena += cena
+        self.kilometraza = max(self.kilometraza, kilometraza)
+        self.datum = max(self.datum, datum)
+
+    def remove(self, doc_id):
+        cena, kilometraza, datum = self.members.pop(doc_id)
+        self.count -= 1
+        self.cena -= cena
+        if not self.members:
+            self.cena = 0.0
+        if kilometraza == self.kilometraza:
+            self.kilometraza = max((v[1] for v in self.members.values()), default=0.0)
+        if datum == self.datum:
+            self.datum = max((v[2] for v in self.members.values()), default="")
+
+    def combine(self, others):
+        for other in others:
+            self.count += other.count
+            self.cena += other.cena
+            self.kilometraza = max(self.kilometraza, other.kilometraza)
+            self.datum = max(self.datum, other.datum)
+        return self
+
+
+class ServisAggregates:
+    # Count, sum of cena, max kilometraza and last datum per vehicle, kept
+    # up to date from the servisi changes. Customers are rolled up from
+    # their vehicles on request.
+
+    def __init__(self):
+        self.vehicles = {}  # pripada -> Totals
+        self.pripada = {}  # doc_id -> pripada
+
+    def update(self, doc_id, data):
+        self.remove(doc_id)
+        pripada = data.get("pripada")
+        values = (
+            number(data.get("cena")),
+            number(data.get("kilometraza")),
+            str(data.get("datum", "")),
+        )
+        self.pripada[doc_id] = pripada
+        self.vehicles.setdefault(pripada, Totals()).add(doc_id, values)
+
+    def remove(self, doc_id):
+        if doc_id not in self.pripada:
+            return
+        pripada = self.pripada.pop(doc_id)
+        totals = self.vehicles[pripada]
+        totals.remove(doc_id)
+        if not totals.count:
+            del self.vehicles[pripada]
+
+    def combine(self, vozila):
+        return Totals().combine(
+            self.vehicles[vozilo_id]
+            for vozilo_id in vozila
+            if vozilo_id in self.vehicles
+        )
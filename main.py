@@ -1,546 +1,1549 @@
-# main.py
-import json
-import os
-
-import firebase_admin
-from PySide6 import QtWidgets
-from PySide6.QtCore import Qt, QLocale, QDateTime, QDate, QTime
-from PySide6.QtGui import QStandardItemModel, QStandardItem
-from PySide6.QtWidgets import (
-    QAbstractItemView,
-    QMessageBox,
-    QHeaderView,
-    QDialog,
-    QVBoxLayout,
-    QLineEdit,
-    QPushButton,
-    QCompleter,
-)
-from PySide6.QtWidgets import QApplication
-from PySide6.QtWidgets import QComboBox
-from firebase_admin import credentials, firestore
-
-from mainWindow import Ui_MainWindow
-
-# Add this at the beginning of your code, before any Qt classes are imported
-APPDATA_FOLDER = os.getenv("APPDATA")
-SETTINGS_PATH = os.path.join(APPDATA_FOLDER, "StefanPOS", "settings.json")
-
-FIELDS = {
-    "korisnici": ["ime", "prezime", "telefon"],
-    "vozila": [
-        "pripada",
-        "model",
-        "vrsta",
-        "sasija",
-        "motor",
-        "tablice",
-        "godiste",
-        "snaga",
-        "kubikaza",
-    ],
-    "servisi": ["pripada", "detalji", "kilometraza", "cena", "datum", "vreme"],
-}
-
-
-class AddItemDialog(QDialog):
-    def __init__(self, mode="korisnici", selected_user_id=None, parent=None):
-        super().__init__(parent)
-        self.mode = mode
-        self.setWindowTitle(
-            "Dodaj" + (" Korisnika" if mode == "korisnici" else " Vozilo")
-        )
-        layout = QVBoxLayout()
-        self.fields = []
-        if mode == "vozila":
-            self.pripada_combo = QComboBox()
-            self.pripada_combo.setEditable(True)
-            layout.addWidget(self.pripada_combo)
-            self.load_users(selected_user_id)
-            self.fields = [
-                ("model", "Model"),
-                ("vrsta", "Vrsta"),
-                ("sasija", "Šasija"),
-                ("motor", "Motor"),
-                ("tablice", "Tablice"),
-                ("godiste", "Godište"),
-                ("snaga", "Snaga"),
-                ("kubikaza", "Kubikaža"),
-            ]
-        elif mode == "korisnici":
-            self.fields = [
-                ("ime", "Ime"),
-                ("prezime", "Prezime"),
-                ("telefon", "Telefon"),
-            ]
-
-        self.edits = {}
-        for field_name, placeholder in self.fields:
-            edit = QLineEdit()
-            edit.setPlaceholderText(placeholder)
-            layout.addWidget(edit)
-            self.edits[field_name] = edit
-
-        self.submit_button = QPushButton("Dodaj")
-        self.submit_button.clicked.connect(self.accept)
-        layout.addWidget(self.submit_button)
-
-        self.setLayout(layout)
-
-    def load_users(self, selected_user_id=None):
-        # Fetch users from the database
-        users_ref = self.parent().db.collection("korisnici").stream()
-        user_names = []
-        user_ids = {}
-        for user in users_ref:
-            user_data = user.to_dict()
-            user_name = f"{user_data['ime']} {user_data['prezime']}"
-            user_id = user.id
-            user_names.append(user_name)
-            user_ids[user_name] = user_id
-
-        # Populate the combo box with user names
-        self.pripada_combo.addItems(user_names)
-
-        # Set up completer with user names
-        self.completer = QCompleter(user_names)
-        self.pripada_combo.setCompleter(self.completer)
-
-        # Set selected user if provided
-        if selected_user_id:
-            selected_user_name = next(
-                (name for name, id_ in user_ids.items() if id_ == selected_user_id),
-                None,
-            )
-            if selected_user_name:
-                self.pripada_combo.setCurrentText(selected_user_name)
-
-        # Store user IDs for later retrieval
-        self.user_ids = user_ids
-
-    def data(self):
-        data = {}
-        if self.mode == "vozila":
-            selected_user_name = self.pripada_combo.currentText()
-            selected_user_id = self.user_ids.get(selected_user_name)
-            data["pripada"] = selected_user_id
-        for field_name, _ in self.fields:
-            data[field_name] = self.edits[field_name].text()
-        return data
-
-
-class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.ui = Ui_MainWindow()
-        self.ui.setupUi(self)
-        self.load_settings()
-
-        # Initialize tables
-        self.init_table("korisnici", ["ID", "Ime", "Prezime", "Telefon"])
-        self.init_table(
-            "vozila",
-            [
-                "ID",
-                "Pripada",
-                "Model",
-                "Vrsta",
-                "Broj šasije",
-                "Broj motora",
-                "Tablice",
-                "Godište",
-                "Snaga",
-                "Kubikaža",
-            ],
-        )
-        self.init_table(
-            "servisi",
-            [
-                "ID",
-                "Pripada",
-                "Detalji",
-                "Kilometraža",
-                "Cena",
-                "Datum",
-                "Vreme",
-            ],
-        )
-        self.field_mapping = {
-            "ID": "id",
-            "Pripada": "pripada",
-            "Ime": "ime",
-            "Prezime": "prezime",
-            "Telefon": "telefon",
-            "Model": "model",
-            "Vrsta": "vrsta",
-            "Broj šasije": "sasija",
-            "Broj motora": "motor",
-            "Tablice": "tablice",
-            "Godište": "godiste",
-            "Snaga": "snaga",
-            "Kubikaža": "kubikaza",
-            "Datum ": "datum",
-            "Vreme ": "vreme",
-            "Detalji": "detalji",
-            "Kilometraža": "kilometraza",
-            "Cena": "cena",
-        }
-
-        # Connect buttons to methods
-        self.ui.pushButton_dodajKorisnika.clicked.connect(
-            lambda: self.add_item("korisnici")
-        )
-        self.ui.pushButton_izbrisiKorisnika.clicked.connect(
-            lambda: self.delete_item("korisnici")
-        )
-        self.ui.pushButton_izbrisiKorisnika.setShortcut(Qt.Key_Backspace)
-        self.ui.pushButton_izbrisiKorisnika.setShortcut(Qt.Key_Delete)
-
-        self.ui.pushButton_dodajVozilo.clicked.connect(lambda: self.add_item("vozila"))
-        self.ui.pushButton_izbrisiVozilo.clicked.connect(
-            lambda: self.delete_item("vozila")
-        )
-        self.ui.pushButton_izbrisiVozilo.setShortcut(Qt.Key_Backspace)
-        self.ui.pushButton_izbrisiVozilo.setShortcut(Qt.Key_Delete)
-
-        self.ui.pushButton_dodaj.clicked.connect(self.add_servis)
-        self.ui.pushButton_izmeni.clicked.connect(self.update_servis)
-        self.ui.pushButton_izbrisi.clicked.connect(lambda: self.delete_item("servisi"))
-        self.ui.pushButton_izbrisi.setShortcut(Qt.Key_Backspace)
-        self.ui.pushButton_izbrisi.setShortcut(Qt.Key_Delete)
-
-        self.ui.horizontalSlider_font.valueChanged.connect(
-            lambda f: self.change_font_size(self.ui.horizontalSlider_font.value())
-        )
-        self.ui.lineEdit_pretraga.textChanged.connect(self.filter_korisnici)
-        self.ui.tableView_servisi.selectionModel().selectionChanged.connect(
-            self.load_servis_data
-        )
-        self.ui.tableView_vozila.selectionModel().selectionChanged.connect(
-            self.filter_servisi_by_vozilo
-        )
-
-        self.clear_servis_data()
-
-    def filter_servisi_by_vozilo(self, selected, deselected):
-        if selected.indexes():
-            # Get the selected vozilo_id
-            row = selected.indexes()[0].row()
-            vozilo_id = self.vozila_model.item(row, 0).text()
-
-            # Retrieve corresponding data for the selected vehicle
-            vozilo_ref = self.db.collection("vozila").document(vozilo_id)
-            vozilo_data = vozilo_ref.get().to_dict()
-
-            # Fill line edits with corresponding data
-            self.ui.lineEdit_model.setText(vozilo_data.get("model", ""))
-            self.ui.lineEdit_vrsta.setText(vozilo_data.get("vrsta", ""))
-            self.ui.lineEdit_brojSasija.setText(vozilo_data.get("sasija", ""))
-            self.ui.lineEdit_brojMotor.setText(vozilo_data.get("motor", ""))
-            self.ui.lineEdit_tablice.setText(vozilo_data.get("tablice", ""))
-            self.ui.lineEdit_godiste.setText(str(vozilo_data.get("godiste", "")))
-            self.ui.lineEdit_snaga.setText(str(vozilo_data.get("snaga", "")))
-            self.ui.lineEdit_kubikaza.setText(str(vozilo_data.get("kubikaza", "")))
-
-            # Filter the servisi based on the selected vozilo_id
-            servisi_model = self.servisi_model
-            for row in range(servisi_model.rowCount()):
-                item = servisi_model.item(
-                    row, 1
-                )  # Assuming pripada is in the second column
-                if item and item.text() != vozilo_id:
-                    self.ui.tableView_servisi.hideRow(row)
-                else:
-                    self.ui.tableView_servisi.showRow(row)
-        else:
-            # If no item is selected in tableView_vozila, show all items in tableView_servisi
-            for row in range(self.ui.tableView_servisi.model().rowCount()):
-                self.ui.tableView_servisi.showRow(row)
-
-    def clear_servis_data(self):
-        self.ui.lineEdit_detaljiServisa.clear()
-        self.ui.lineEdit_kilometraza.clear()
-        self.ui.lineEdit_cena.clear()
-        self.ui.dateEdit_datum.setDate(QDate.currentDate())
-        self.ui.timeEdit_vreme.setTime(QTime.currentTime())
-
-    def load_servis_data(self, selected, deselected):
-        if selected.indexes():
-            row = selected.indexes()[0].row()
-            model = self.servisi_model
-            doc_id = model.item(row, 0).text()
-            doc_ref = self.db.collection("servisi").document(doc_id)
-            doc_data = doc_ref.get().to_dict()
-            self.ui.lineEdit_detaljiServisa.setText(doc_data.get("detalji", ""))
-            self.ui.lineEdit_kilometraza.setText(str(doc_data.get("kilometraza", "")))
-            self.ui.lineEdit_cena.setText(str(doc_data.get("cena", "")))
-            datum_vreme = doc_data.get("datum_vreme")
-            if datum_vreme:
-                datum, vreme = datum_vreme.split(" ")
-                self.ui.dateEdit_datum.setDate(QDate.fromString(datum, "yyyy-MM-dd"))
-                self.ui.timeEdit_vreme.setTime(QTime.fromString(vreme, "HH:mm:ss"))
-        else:
-            self.clear_servis_data()
-
-    def filter_korisnici(self, text):
-        search_text = self.ui.lineEdit_pretraga.text().lower()
-        model = self.korisnici_model
-
-        for row in range(model.rowCount()):
-            match_found = any(
-                search_text in model.item(row, col).text().lower()
-                for col in range(model.columnCount())
-                if model.item(row, col) is not None
-            )
-
-            if match_found:
-                self.ui.tableView_korisnici.showRow(row)
-            else:
-                self.ui.tableView_korisnici.hideRow(row)
-
-    def load_settings(self):
-        # Load settings from settings.json
-        if os.path.exists(SETTINGS_PATH):
-            with open(SETTINGS_PATH, "r") as file:
-                settings = json.load(file)
-                font_size = settings.get("font_size", 12)
-                cred_location = settings.get("cred_location", "")
-
-                # Set font size
-                self.change_font_size(font_size)
-                self.ui.horizontalSlider_font.setValue(font_size)
-
-                # Load Firebase Admin credentials
-                if cred_location:
-                    cred = credentials.Certificate(cred_location)
-                    firebase_admin.initialize_app(cred)
-                    self.db = firestore.client()
-                else:
-                    print("No cred_location found in settings.json")
-
-    def change_font_size(self, font_size):
-        app = QApplication.instance()
-        font = app.font()
-        font.setPointSize(font_size)
-        app.setFont(font)
-        self.update_settings({"font_size": font_size})
-
-    def update_settings(self, new_settings):
-        # Update settings.json with new settings
-        if os.path.exists(SETTINGS_PATH):
-            with open(SETTINGS_PATH, "r") as file:
-                settings = json.load(file)
-                settings.update(new_settings)
-
-            with open(SETTINGS_PATH, "w") as file:
-                json.dump(settings, file, indent=4)
-
-    def add_item(self, item_type):
-        selected_user_id = None
-        selected_indexes = self.ui.tableView_korisnici.selectedIndexes()
-        if selected_indexes and item_type == "vozila":
-            row = selected_indexes[0].row()
-            selected_user_id = self.korisnici_model.item(row, 0).text()
-            print(selected_user_id, "selected")
-        dialog = AddItemDialog(item_type, selected_user_id, self)
-        if dialog.exec() == QDialog.Accepted:
-            data = dialog.data()
-            collection_ref = self.db.collection(item_type)
-            collection_ref.add(data)
-
-    def add_servis(self):
-        selected_indexes = self.ui.tableView_vozila.selectedIndexes()
-        if selected_indexes:
-            row = selected_indexes[0].row()
-            vozilo_id = self.vozila_model.item(row, 0).text()
-            detalji = self.ui.lineEdit_detaljiServisa.toPlainText()
-            kilometraza = self.ui.lineEdit_kilometraza.text()
-            cena = self.ui.lineEdit_cena.text()
-            datum = self.ui.dateEdit_datum.date().toString(Qt.ISODate)
-            vreme = self.ui.timeEdit_vreme.time().toString("HH:mm:ss")
-
-            data = {
-                "pripada": vozilo_id,
-                "detalji": detalji,
-                "kilometraza": int(kilometraza) if kilometraza else 0,
-                "cena": float(cena) if cena else 0.0,
-                "datum": datum,  # Separate date
-                "vreme": vreme,  # Separate time
-            }
-
-            collection_ref = self.db.collection("servisi")
-            collection_ref.add(data)
-
-            self.clear_servis_data()
-        else:
-            QMessageBox.warning(self, "Upozorenje", "Prvo odaberite vozilo.")
-
-    def update_servis(self):
-        selected_indexes = self.ui.tableView_servisi.selectedIndexes()
-        if selected_indexes:
-            row = selected_indexes[0].row()
-            servis_id = self.servisi_model.item(row, 0).text()
-            detalji = self.ui.lineEdit_detaljiServisa.toPlainText()
-            kilometraza = self.ui.lineEdit_kilometraza.text()
-            cena = self.ui.lineEdit_cena.text()
-            datum = self.ui.dateEdit_datum.date().toString(Qt.ISODate)
-            vreme = self.ui.timeEdit_vreme.time().toString("HH:mm:ss")
-
-            data = {
-                "detalji": detalji,
-                "kilometraza": int(kilometraza) if kilometraza else 0,
-                "cena": float(cena) if cena else 0.0,
-                "datum": datum,  # Separate date
-                "vreme": vreme,  # Separate time
-            }
-
-            ref = self.db.collection("servisi").document(servis_id)
-            confirm = QMessageBox.question(
-                self,
-                "Potvrda",
-                "Da li ste sigurni da želite da ažurirate ovaj servis?",
-                QMessageBox.Yes | QMessageBox.No,
-            )
-            if confirm == QMessageBox.Yes:
-                ref.update(data)
-        else:
-            QMessageBox.warning(self, "Upozorenje", "Prvo odaberite servis.")
-
-    def delete_item(self, item_type):
-        selected_indexes = getattr(self.ui, f"tableView_{item_type}").selectedIndexes()
-        if selected_indexes:
-            row = selected_indexes[0].row()
-            item = getattr(self, f"{item_type}_model").item(row, 0)
-            doc_id = item.text()
-            confirm = QMessageBox.question(
-                self,
-                "Confirmation",
-                "Are you sure you want to delete this item?",
-                QMessageBox.Yes | QMessageBox.No,
-            )
-            if confirm == QMessageBox.Yes:
-                self.remove_row(item_type, doc_id)
-                self.remove_from_database(item_type, doc_id)
-
-    def remove_from_database(self, item_type, doc_id):
-        ref = self.db.collection(item_type).document(doc_id)
-        ref.delete()
-
-    def init_table(self, item_type, headers):
-        # Set up model and headers for table
-        model = QStandardItemModel()
-        model.setHorizontalHeaderLabels(headers)
-        table_view = getattr(self.ui, f"tableView_{item_type}")
-        table_view.setModel(model)
-        table_view.setEditTriggers(QAbstractItemView.DoubleClicked)
-
-        # Fetch data from Firestore
-        collection_ref = self.db.collection(item_type)
-        listener = collection_ref.on_snapshot(
-            lambda snapshot, changes, read_time: self.update_table(
-                item_type, snapshot, changes, read_time
-            )
-        )
-
-        # Connect dataChanged signal to update_database method
-        model.dataChanged.connect(
-            lambda index: self.update_in_database(item_type, index)
-        )
-
-        table_view.hideColumn(0)
-        if item_type == "vozila" or item_type == "servisi":
-            table_view.hideColumn(1)
-
-        # Resize columns to stretch
-        table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        table_view.resizeColumnsToContents()
-
-        # Store model and listener
-        setattr(self, f"{item_type}_model", model)
-        setattr(self, f"{item_type}_listener", listener)
-
-    def update_table(self, item_type, snapshot, changes, read_time):
-        model = getattr(self, f"{item_type}_model")
-        for change in changes:
-            if change.type.name == "ADDED":
-                doc = change.document
-                self.add_row(item_type, doc.id, doc.to_dict())
-            elif change.type.name == "MODIFIED":
-                doc = change.document
-                self.update_row(item_type, doc.id, doc.to_dict())
-            elif change.type.name == "REMOVED":
-                self.remove_row(item_type, change.document.id)
-
-    def add_row(self, item_type, doc_id, data):
-        model = getattr(self, f"{item_type}_model")
-        row = [QStandardItem(doc_id)]  # Insert document ID as the first item
-        for field in FIELDS[item_type]:
-            value = data.get(field, "")
-            if item_type == "servisi" and field == "datum_vreme":
-                datum, vreme = value.split(" ")
-                value = QDateTime.fromString(
-                    f"{datum} {vreme}", "yyyy-MM-dd HH:mm:ss"
-                ).toString("dd.MM.yyyy. HH:mm")
-            item = QStandardItem(str(value))
-            item.setEditable(True)
-            row.append(item)
-        model.appendRow(row)
-
-    def update_row(self, item_type, doc_id, data):
-        model = getattr(self, f"{item_type}_model")
-        for row in range(model.rowCount()):
-            if model.item(row, 0).text() == doc_id:
-                for col, field in enumerate(FIELDS[item_type]):
-                    value = data.get(field, "")
-                    if item_type == "servisi" and field == "datum_vreme":
-                        datum, vreme = value.split(" ")
-                        value = QDateTime.fromString(
-                            f"{datum} {vreme}", "yyyy-MM-dd HH:mm:ss"
-                        ).toString("dd.MM.yyyy. HH:mm")
-                    model.item(row, col + 1).setText(str(value))
-
-    def remove_row(self, item_type, doc_id):
-        model = getattr(self, f"{item_type}_model")
-        for row in range(model.rowCount()):
-            if model.item(row, 0).text() == doc_id:
-                model.removeRow(row)
-                return
-
-    def update_in_database(self, item_type, index):
-        model = getattr(self, f"{item_type}_model")
-        row = index.row()
-        doc_id_item = model.item(row, 0)
-        doc_id = doc_id_item.text()
-        field_display_name = model.horizontalHeaderItem(index.column()).text()
-
-        # Translate displayed name to database field name
-        field_name = self.field_mapping.get(field_display_name, "").lower()
-        if not field_name:
-            return
-
-        new_value = index.data(Qt.DisplayRole)
-
-        # Retrieve previous value from the database
-        doc_ref = self.db.collection(item_type).document(doc_id)
-        doc = doc_ref.get()
-        old_value = doc.to_dict().get(field_name)
-
-        # Update the value in the database
-        confirm = QMessageBox.question(
-            self,
-            "Potvrda",
-            f"Da li želite da napravite izmenu?\nPrethodna vrednost: {old_value}\nNova vrednost: {new_value}",
-            QMessageBox.Yes | QMessageBox.No,
-        )
-        if confirm == QMessageBox.Yes:
-            doc_ref.update({field_name: new_value})
-
-
-if __name__ == "__main__":
-    # Set Serbian locale
-    locale = QLocale(QLocale.Serbian, QLocale.Serbia)
-    QLocale.setDefault(locale)
-    app = QtWidgets.QApplication([])
-    window = MainWindow()
-    window.show()
-    app.exec()
+# main.py
+import platform
+import threading
+import time
+
+# Taken before the imports below, so they count towards the startup time
+STARTED = time.perf_counter()
+
+import os
+
+from PySide6 import QtWidgets
+from PySide6.QtCore import Qt, QLocale, QDate, QTime, QTimer, Signal
+from PySide6.QtWidgets import (
+    QAbstractItemView,
+    QMessageBox,
+    QHeaderView,
+    QDialog,
+    QVBoxLayout,
+    QLineEdit,
+    QPushButton,
+    QCompleter,
+    QProgressDialog,
+    QFileDialog,
+    QInputDialog,
+    QDateEdit,
+    QFormLayout,
+    QLabel,
+    QHBoxLayout,
+    QTableWidget,
+    QTableWidgetItem,
+    QWidget,
+)
+from PySide6.QtWidgets import QApplication
+from PySide6.QtWidgets import QComboBox
+
+from mainWindow import Ui_MainWindow
+from backend import SERVER_TIMESTAMP, FirestoreBackend, SqliteBackend
+from cache import SnapshotCache
+from exporter import Exporter
+from importer import CheckpointStore, Importer
+from indexes import FieldIndex, KeyIndex, SearchIndex, ServisAggregates
+import metrics
+from models import (
+    DocumentFilterProxyModel,
+    DocumentLabelProxyModel,
+    DocumentTableModel,
+    datetime_key,
+    numeric_key,
+)
+from settings import Settings
+from startup import StartupTimings
+from store import DocumentStore
+from workers import ReadExecutor, WriteQueue
+
+# Add this at the beginning of your code, before any Qt classes are imported
+APPDATA_FOLDER = os.getenv("APPDATA")
+SETTINGS_PATH = os.path.join(APPDATA_FOLDER, "StefanPOS", "settings.json")
+CACHE_PATH = os.path.join(APPDATA_FOLDER, "StefanPOS", "cache.sqlite3")
+IMPORTS_PATH = os.path.join(APPDATA_FOLDER, "StefanPOS", "imports.json")
+STARTUP_PATH = os.path.join(APPDATA_FOLDER, "StefanPOS", "startup.json")
+METRICS_PATH = os.path.join(APPDATA_FOLDER, "StefanPOS", "metrics.log")
+# Database of the "sqlite" backend, unless settings.json names another file
+DATABASE_PATH = os.path.join(APPDATA_FOLDER, "StefanPOS", "database.sqlite3")
+
+# Server timestamp stamped on every write, used to listen only for newer changes
+UPDATED_FIELD = "izmenjeno"
+# Collection recording deletions for terminals that were offline at the time
+TOMBSTONES = "obrisano"
+
+# Seconds to wait for queued writes when the window is closed
+WRITE_FLUSH_TIMEOUT = 30
+
+# Cached documents applied at a time, and the longest stretch of them
+# applied before the event loop gets a turn
+CACHE_CHUNK = 150
+CACHE_SLICE_MS = 100
+
+# Delay between the last keystroke in lineEdit_pretraga and filtering
+SEARCH_DEBOUNCE_MS = 200
+# Delay between the last horizontalSlider_font tick and resizing the font
+FONT_DEBOUNCE_MS = 150
+
+# Refresh interval of the metrics in the status bar, and of the metrics log
+METRICS_STATUS_MS = 2000
+METRICS_LOG_MS = 60000
+# How often the "last servisi_days days" window is checked for a new day
+SERVISI_CUTOFF_CHECK_MS = 600000
+# Latencies shown in the status bar, as 95th percentiles
+METRICS_STATUS = [
+    ("snapshot", "snimak"),
+    ("filter_korisnici", "pretraga"),
+    ("db_read", "čitanje"),
+    ("db_commit", "upis"),
+]
+# Report periods as shown, as reports.PERIODS names them, and their labels
+REPORT_PERIODS = ["Dan", "Nedelja", "Mesec"]
+REPORT_PERIOD_KEYS = ["dan", "nedelja", "mesec"]
+REPORT_PERIOD_FORMATS = ["dd.MM.yyyy.", "'od' dd.MM.yyyy.", "MM.yyyy."]
+
+
+FIELDS = {
+    "korisnici": ["ime", "prezime", "telefon"],
+    "vozila": [
+        "pripada",
+        "model",
+        "vrsta",
+        "sasija",
+        "motor",
+        "tablice",
+        "godiste",
+        "snaga",
+        "kubikaza",
+    ],
+    "servisi": ["pripada", "detalji", "kilometraza", "cena", "datum", "vreme"],
+}
+# Columns sorted by a typed key instead of their text, the key is computed
+# from the listed fields whenever a row is stored
+SORT_KEYS = {
+    "vozila": {
+        "godiste": (numeric_key, ["godiste"]),
+        "snaga": (numeric_key, ["snaga"]),
+        "kubikaza": (numeric_key, ["kubikaza"]),
+    },
+    "servisi": {
+        "kilometraza": (numeric_key, ["kilometraza"]),
+        "cena": (numeric_key, ["cena"]),
+        "datum": (datetime_key, ["datum", "vreme"]),
+    },
+}
+
+
+class AddItemDialog(QDialog):
+    def __init__(self, mode="korisnici", selected_user_id=None, parent=None):
+        super().__init__(parent)
+        self.mode = mode
+        self.setWindowTitle(
+            "Dodaj" + (" Korisnika" if mode == "korisnici" else " Vozilo")
+        )
+        layout = QVBoxLayout()
+        self.fields = []
+        if mode == "vozila":
+            self.pripada_combo = QComboBox()
+            self.pripada_combo.setEditable(True)
+            layout.addWidget(self.pripada_combo)
+            self.load_users(selected_user_id)
+            self.fields = [
+                ("model", "Model"),
+                ("vrsta", "Vrsta"),
+                ("sasija", "Šasija"),
+                ("motor", "Motor"),
+                ("tablice", "Tablice"),
+                ("godiste", "Godište"),
+                ("snaga", "Snaga"),
+                ("kubikaza", "Kubikaža"),
+            ]
+        elif mode == "korisnici":
+            self.fields = [
+                ("ime", "Ime"),
+                ("prezime", "Prezime"),
+                ("telefon", "Telefon"),
+            ]
+
+        self.edits = {}
+        for field_name, placeholder in self.fields:
+            edit = QLineEdit()
+            edit.setPlaceholderText(placeholder)
+            layout.addWidget(edit)
+            self.edits[field_name] = edit
+
+        self.submit_button = QPushButton("Dodaj")
+        self.submit_button.clicked.connect(self.accept)
+        layout.addWidget(self.submit_button)
+
+        self.setLayout(layout)
+
+    def load_users(self, selected_user_id=None):
+        # Users come from the main window's live korisnici model, no reads needed
+        user_names = self.parent().korisnici_names
+        self.pripada_combo.setModel(user_names)
+
+        # Set up completer with user names
+        self.completer = QCompleter(user_names, self)
+        self.pripada_combo.setCompleter(self.completer)
+
+        # Set selected user if provided
+        if selected_user_id:
+            row = self.parent().korisnici_model.row_of(selected_user_id)
+            if row is not None:
+                self.pripada_combo.setCurrentIndex(row)
+
+    def data(self):
+        data = {}
+        if self.mode == "vozila":
+            selected_user_name = self.pripada_combo.currentText()
+            index = self.pripada_combo.currentIndex()
+            if self.pripada_combo.itemText(index) != selected_user_name:
+                index = self.pripada_combo.findText(selected_user_name)
+            selected_user_id = (
+                self.pripada_combo.itemData(index) if index >= 0 else None
+            )
+            data["pripada"] = selected_user_id
+        for field_name, _ in self.fields:
+            data[field_name] = self.edits[field_name].text()
+        return data
+
+
+class ExportDialog(QDialog):
+    SCOPES = ["Svi servisi", "Odabrano vozilo", "Odabrani korisnik"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Izvoz servisa")
+        layout = QFormLayout()
+
+        self.date_from = QDateEdit(QDate.currentDate().addYears(-1))
+        self.date_from.setCalendarPopup(True)
+        self.date_to = QDateEdit(QDate.currentDate())
+        self.date_to.setCalendarPopup(True)
+        self.scope_combo = QComboBox()
+        self.scope_combo.addItems(self.SCOPES)
+        layout.addRow("Od", self.date_from)
+        layout.addRow("Do", self.date_to)
+        layout.addRow("Servisi", self.scope_combo)
+
+        self.submit_button = QPushButton("Izvezi")
+        self.submit_button.clicked.connect(self.accept)
+        layout.addRow(self.submit_button)
+
+        self.setLayout(layout)
+
+    def data(self):
+        return (
+            self.date_from.date().toString(Qt.ISODate),
+            self.date_to.date().toString(Qt.ISODate),
+            self.scope_combo.currentIndex(),
+        )
+
+
+class MainWindow(QtWidgets.QMainWindow):
+    # Carries one snapshot's changes from the Firestore listener thread to the GUI thread
+    snapshot_received = Signal(str, object, object)
+    vozilo_snapshot_received = Signal(object)
+    connected = Signal(object)
+    connect_failed = Signal(str)
+
+    def __init__(self, timings=None):
+        super().__init__()
+        self.timings = timings or StartupTimings()
+        self.ui = Ui_MainWindow()
+        self.ui.setupUi(self)
+        self.korisnici_search = SearchIndex(FIELDS["korisnici"])
+        self.servisi_pripada = FieldIndex("pripada")
+        self.vozila_pripada = FieldIndex("pripada")
+        self.vozila_keys = KeyIndex(["tablice", "sasija", "motor"])
+        self.servisi_totals = ServisAggregates()
+        self.delete_progress = None
+        self.snapshot_received.connect(self.update_table, Qt.QueuedConnection)
+        self.vozilo_snapshot_received.connect(
+            self.update_vozilo_servisi, Qt.QueuedConnection
+        )
+        self.connected.connect(self.on_connected, Qt.QueuedConnection)
+        self.connect_failed.connect(self.show_connect_error, Qt.QueuedConnection)
+        self.db = None
+        self.synced = set()
+        self.load_settings()
+        self.writes = WriteQueue(self.db, self)
+        self.writes.progress.connect(self.show_write_progress)
+        self.writes.failed.connect(self.show_write_error)
+        self.writes.conflicted.connect(self.show_edit_conflict)
+        self.reads = ReadExecutor(parent=self)
+        self.reads.failed.connect(self.show_read_error)
+        self.cache = SnapshotCache(CACHE_PATH)
+        self.cache_read_times = {}
+        self.cache_loaded = False
+        self.listening = False
+        self.servisi_cutoff = self.current_servisi_cutoff()
+        self.vozilo_servisi_listener = None
+        self.watched_vozilo_id = None
+        # Scoped mode: full history totals of the selected owner's other
+        # vehicles, read once per selection
+        self.owner_totals_key = None
+        self.owner_totals = None
+
+        self.init_totals()
+        self.init_lookup()
+
+        # Initialize tables
+        self.init_table("korisnici", ["ID", "Ime", "Prezime", "Telefon"])
+        self.init_table(
+            "vozila",
+            [
+                "ID",
+                "Pripada",
+                "Model",
+                "Vrsta",
+                "Broj šasije",
+                "Broj motora",
+                "Tablice",
+                "Godište",
+                "Snaga",
+                "Kubikaža",
+            ],
+        )
+        self.init_table(
+            "servisi",
+            [
+                "ID",
+                "Pripada",
+                "Detalji",
+                "Kilometraža",
+                "Cena",
+                "Datum",
+                "Vreme",
+            ],
+        )
+        self.korisnici_names = DocumentLabelProxyModel(["ime", "prezime"], self)
+        self.korisnici_names.setSourceModel(self.korisnici_model)
+        self.field_mapping = {
+            "ID": "id",
+            "Pripada": "pripada",
+            "Ime": "ime",
+            "Prezime": "prezime",
+            "Telefon": "telefon",
+            "Model": "model",
+            "Vrsta": "vrsta",
+            "Broj šasije": "sasija",
+            "Broj motora": "motor",
+            "Tablice": "tablice",
+            "Godište": "godiste",
+            "Snaga": "snaga",
+            "Kubikaža": "kubikaza",
+            "Datum ": "datum",
+            "Vreme ": "vreme",
+            "Detalji": "detalji",
+            "Kilometraža": "kilometraza",
+            "Cena": "cena",
+        }
+
+        # Connect buttons to methods
+        self.ui.pushButton_dodajKorisnika.clicked.connect(
+            lambda: self.add_item("korisnici")
+        )
+        self.ui.pushButton_izbrisiKorisnika.clicked.connect(
+            lambda: self.delete_item("korisnici")
+        )
+        self.ui.pushButton_izbrisiKorisnika.setShortcut(Qt.Key_Backspace)
+        self.ui.pushButton_izbrisiKorisnika.setShortcut(Qt.Key_Delete)
+
+        self.ui.pushButton_dodajVozilo.clicked.connect(lambda: self.add_item("vozila"))
+        self.ui.pushButton_izbrisiVozilo.clicked.connect(
+            lambda: self.delete_item("vozila")
+        )
+        self.ui.pushButton_izbrisiVozilo.setShortcut(Qt.Key_Backspace)
+        self.ui.pushButton_izbrisiVozilo.setShortcut(Qt.Key_Delete)
+
+        self.ui.pushButton_dodaj.clicked.connect(self.add_servis)
+        self.ui.pushButton_izmeni.clicked.connect(self.update_servis)
+        self.ui.pushButton_izbrisi.clicked.connect(lambda: self.delete_item("servisi"))
+        self.ui.pushButton_izbrisi.setShortcut(Qt.Key_Backspace)
+        self.ui.pushButton_izbrisi.setShortcut(Qt.Key_Delete)
+
+        self.font_timer = QTimer(self)
+        self.font_timer.setSingleShot(True)
+        self.font_timer.setInterval(FONT_DEBOUNCE_MS)
+        self.font_timer.timeout.connect(
+            lambda: self.change_font_size(self.ui.horizontalSlider_font.value())
+        )
+        self.ui.horizontalSlider_font.valueChanged.connect(
+            lambda _value: self.font_timer.start()
+        )
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_korisnici)
+        self.ui.lineEdit_pretraga.textChanged.connect(self.search_timer.start)
+        self.ui.tableView_servisi.selectionModel().selectionChanged.connect(
+            self.load_servis_data
+        )
+        self.ui.tableView_vozila.selectionModel().selectionChanged.connect(
+            self.filter_servisi_by_vozilo
+        )
+
+        self.importer = None
+        self.exporter = None
+        menu = self.ui.menubar.addMenu("Datoteka")
+        menu.addAction("Uvezi...", self.import_file)
+        menu.addAction("Izvezi servise...", self.export_servisi)
+
+        self.init_metrics()
+        self.init_reports()
+        if self.servisi_days:
+            self.servisi_cutoff_timer = QTimer(self)
+            self.servisi_cutoff_timer.setInterval(SERVISI_CUTOFF_CHECK_MS)
+            self.servisi_cutoff_timer.timeout.connect(self.update_servisi_cutoff)
+            self.servisi_cutoff_timer.start()
+        self.clear_servis_data()
+        self.timings.mark("window")
+
+    def init_metrics(self):
+        self.metrics_label = QLabel(self)
+        self.ui.statusbar.addPermanentWidget(self.metrics_label)
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(METRICS_STATUS_MS)
+        self.metrics_timer.timeout.connect(self.show_metrics)
+        self.metrics_timer.start()
+
+        # Optional log for collecting metrics from the terminals
+        self.metrics_log = None
+        if self.settings.get("metrics_log", False):
+            self.metrics_log = metrics.MetricsLog(
+                self.settings.get("metrics_log_path", METRICS_PATH),
+                platform.node(),
+            )
+            self.metrics_log_timer = QTimer(self)
+            self.metrics_log_timer.setInterval(METRICS_LOG_MS)
+            self.metrics_log_timer.timeout.connect(self.metrics_log.write)
+            self.metrics_log_timer.start()
+
+    def init_totals(self):
+        # Summary of the selected vehicle and its owner, under the vehicle data
+        layout = QHBoxLayout()
+        self.label_totalsVozilo = QLabel(self.ui.tab_servis)
+        self.label_totalsKorisnik = QLabel(self.ui.tab_servis)
+        layout.addWidget(self.label_totalsVozilo)
+        layout.addWidget(self.label_totalsKorisnik)
+        self.ui.verticalLayout_glavniServis.insertLayout(1, layout)
+
+    def init_lookup(self):
+        # Vehicle lookup by plate, chassis or engine number, under the search
+        self.lineEdit_vozilo = QLineEdit(self.ui.tab_korisnici)
+        self.lineEdit_vozilo.setPlaceholderText("Tablice, broj šasije ili motora")
+        self.lineEdit_vozilo.returnPressed.connect(self.lookup_vozilo)
+        self.ui.verticalLayout_glavniMeni.insertWidget(1, self.lineEdit_vozilo)
+
+    def lookup_vozilo(self):
+        text = self.lineEdit_vozilo.text()
+        with metrics.timer("lookup_vozilo"):
+            vozila = self.vozila_keys.get(text)
+        if not vozila:
+            self.ui.statusbar.showMessage(f"Vozilo {text} nije pronađeno.", 5000)
+            return
+        vozilo_id = min(vozila)
+        self.ui.statusbar.clearMessage()
+        if len(vozila) > 1:
+            self.ui.statusbar.showMessage(
+                f"Pronađeno vozila: {len(vozila)}, prikazano je prvo.", 5000
+            )
+
+        # The owner may be hidden by the customer search, which is cleared then
+        owner_id = self.vozila_store.documents[vozilo_id].get("pripada")
+        if owner_id in self.korisnici_store.documents and not self.select_row(
+            "korisnici", owner_id
+        ):
+            self.ui.lineEdit_pretraga.clear()
+            self.search_timer.stop()
+            self.filter_korisnici()
+            self.select_row("korisnici", owner_id)
+        # Selecting the vehicle filters its services
+        self.select_row("vozila", vozilo_id)
+        self.ui.tabWidget.setCurrentWidget(self.ui.tab_servis)
+
+    def select_row(self, item_type, doc_id):
+        # Selects and shows the document's row, False if it is not shown
+        row = getattr(self, f"{item_type}_model").row_of(doc_id)
+        if row is None:
+            return False
+        proxy = getattr(self, f"{item_type}_proxy")
+        index = proxy.mapFromSource(getattr(self, f"{item_type}_model").index(row, 0))
+        if not index.isValid():
+            return False
+        table_view = getattr(self.ui, f"tableView_{item_type}")
+        table_view.selectRow(index.row())
+        table_view.scrollTo(index)
+        return True
+
+    def show_totals(self):
+        selected_indexes = self.ui.tableView_vozila.selectedIndexes()
+        if not selected_indexes:
+            self.label_totalsVozilo.clear()
+            self.label_totalsKorisnik.clear()
+            self.owner_totals_key = None
+            return
+        vozilo_id = self.doc_id_at("vozila", selected_indexes[0])
+        owner_id = (self.vozila_store.documents.get(vozilo_id) or {}).get("pripada")
+        vozilo_totals = self.servisi_totals.combine([vozilo_id])
+        self.label_totalsVozilo.setText("Vozilo: " + self.format_totals(vozilo_totals))
+
+        vozila = self.vozila_pripada.get(owner_id)
+        if not self.servisi_days:
+            owner_totals = self.servisi_totals.combine(vozila)
+        else:
+            # Only the selected vehicle's history is loaded, the owner's
+            # other vehicles are totalled from a read of their services
+            others = frozenset(vozila) - {vozilo_id}
+            key = (owner_id, others)
+            if key != self.owner_totals_key:
+                self.owner_totals = None
+                if self.db is not None:
+                    self.owner_totals_key = key
+                    self.reads.submit(
+                        "totals",
+                        lambda: self.query_servisi_totals(others),
+                        lambda totals: self.show_owner_totals(key, totals),
+                    )
+            if self.owner_totals is None:
+                self.label_totalsKorisnik.setText("Korisnik: učitavanje...")
+                return
+            owner_totals = self.owner_totals.combine(others).combine([vozilo_totals])
+        self.label_totalsKorisnik.setText(
+            "Korisnik: " + self.format_totals(owner_totals)
+        )
+
+    def query_servisi_totals(self, vozila):
+        # Runs on the read pool, only the summed fields are fetched
+        totals = ServisAggregates()
+        if vozila:
+            for doc_id, data in self.db.stream(
+                "servisi",
+                [("pripada", "in", list(vozila))],
+                fields=["pripada", "cena", "kilometraza", "datum"],
+            ):
+                totals.update(doc_id, data)
+        return totals
+
+    def show_owner_totals(self, key, totals):
+        if key == self.owner_totals_key:
+            self.owner_totals = totals
+            self.show_totals()
+
+    def format_totals(self, totals):
+        if not totals.count:
+            return "nema servisa"
+        locale = QLocale()
+        datum = QDate.fromString(totals.datum, Qt.ISODate)
+        return (
+            f"{totals.count} servisa, ukupno {locale.toString(totals.cena, 'f', 2)},"
+            f" kilometraža {locale.toString(totals.kilometraza, 'f', 0)},"
+            f" poslednji {datum.toString('dd.MM.yyyy.') if datum.isValid() else totals.datum}"
+        )
+
+    def init_reports(self):
+        # Izveštaji tab, filled in when it is opened or Prikaži is pressed
+        self.report = None
+        self.tab_izvestaji = QWidget()
+        layout = QVBoxLayout(self.tab_izvestaji)
+        controls = QHBoxLayout()
+        self.report_from = QDateEdit(QDate.currentDate().addYears(-1))
+        self.report_from.setCalendarPopup(True)
+        self.report_to = QDateEdit(QDate.currentDate())
+        self.report_to.setCalendarPopup(True)
+        self.report_period = QComboBox()
+        self.report_period.addItems(REPORT_PERIODS)
+        self.report_period.setCurrentIndex(2)
+        show_button = QPushButton("Prikaži")
+        show_button.clicked.connect(self.show_report)
+        for label, widget in (
+            ("Od", self.report_from),
+            ("Do", self.report_to),
+            ("Po", self.report_period),
+        ):
+            controls.addWidget(QLabel(label))
+            controls.addWidget(widget)
+        controls.addWidget(show_button)
+        controls.addStretch()
+        layout.addLayout(controls)
+
+        self.report_summary = QLabel()
+        layout.addWidget(self.report_summary)
+        tables = QHBoxLayout()
+        self.report_periods = QTableWidget(0, 5)
+        self.report_periods.setHorizontalHeaderLabels(
+            ["Period", "Servisa", "Prihod", "Prosečan račun", "Prosečna kilometraža"]
+        )
+        self.report_kilometraza = QTableWidget(0, 2)
+        self.report_kilometraza.setHorizontalHeaderLabels(["Kilometraža", "Servisa"])
+        for table in (self.report_periods, self.report_kilometraza):
+            table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            table.setAlternatingRowColors(True)
+            table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        tables.addWidget(self.report_periods, 3)
+        tables.addWidget(self.report_kilometraza, 1)
+        layout.addLayout(tables)
+
+        self.ui.tabWidget.addTab(self.tab_izvestaji, "Izveštaji")
+        self.ui.tabWidget.currentChanged.connect(self.on_tab_changed)
+
+    def on_tab_changed(self, index):
+        if self.ui.tabWidget.widget(index) is self.tab_izvestaji:
+            self.show_report()
+
+    def show_report(self):
+        if self.report is None:
+            # NumPy is only imported once a report is asked for
+            from reports import ServisReport
+
+            self.report = ServisReport()
+        start = self.report_from.date().toString(Qt.ISODate)
+        end = self.report_to.date().toString(Qt.ISODate)
+        period = self.report_period.currentIndex()
+        with metrics.timer("report"):
+            self.report.load(self.servisi_store)
+            summary = self.report.summary(start, end)
+            periods = self.report.by_period(REPORT_PERIOD_KEYS[period], start, end)
+            distribution = self.report.kilometraza_distribution(start, end)
+
+        locale = QLocale()
+        self.report_summary.setText(
+            f"{summary['count']} servisa, prihod"
+            f" {locale.toString(summary['prihod'], 'f', 2)}, prosečan račun"
+            f" {locale.toString(summary['prosek'], 'f', 2)}, medijan"
+            f" {locale.toString(summary['medijan'], 'f', 2)}, prosečna kilometraža"
+            f" {locale.toString(summary['kilometraza'], 'f', 0)}"
+        )
+        self.fill_report_table(
+            self.report_periods,
+            [
+                (
+                    QDate.fromString(key, Qt.ISODate).toString(
+                        REPORT_PERIOD_FORMATS[period]
+                    ),
+                    str(count),
+                    locale.toString(prihod, "f", 2),
+                    locale.toString(prosek, "f", 2),
+                    locale.toString(kilometraza, "f", 0),
+                )
+                for key, count, prihod, prosek, kilometraza in periods
+            ],
+        )
+        self.fill_report_table(
+            self.report_kilometraza,
+            [
+                (
+                    f"{locale.toString(low)} – {locale.toString(high)}",
+                    str(count),
+                )
+                for low, high, count in distribution
+            ],
+        )
+
+    def fill_report_table(self, table, rows):
+        table.setUpdatesEnabled(False)
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, column, item)
+        table.setUpdatesEnabled(True)
+
+    def show_metrics(self):
+        parts = []
+        for name, label in METRICS_STATUS:
+            value = metrics.percentile(name, 0.95)
+            if value is not None:
+                parts.append(f"{label} {value:.0f} ms")
+        self.metrics_label.setText(" · ".join(parts))
+
+        snapshot = metrics.snapshot()
+        lines = [
+            f"{name}: p50 {h['p50']:.0f}, p95 {h['p95']:.0f}, max {h['max']:.0f}"
+            f" ({h['count']}x)"
+            for name, h in sorted(snapshot["histograms"].items())
+        ]
+        lines += [
+            f"{name}: {value}" for name, value in sorted(snapshot["counters"].items())
+        ]
+        lines += [
+            f"{name}: {value}" for name, value in sorted(snapshot["gauges"].items())
+        ]
+        self.metrics_label.setToolTip("\n".join(lines))
+
+    def connect_database(self):
+        # Called once the window is shown, the listeners start when both the
+        # connection and the cache are in
+        self.ui.statusbar.showMessage("Povezivanje sa bazom podataka...")
+        threading.Thread(target=self.open_database_thread, daemon=True).start()
+
+    def open_database_thread(self):
+        try:
+            db = self.open_database()
+        except Exception as error:
+            self.connect_failed.emit(str(error))
+            return
+        self.connected.emit(db)
+
+    def open_database(self):
+        # Runs on the connect thread. The "sqlite" backend keeps everything
+        # on this workstation and works without internet.
+        if self.settings.get("backend", "firestore") == "sqlite":
+            return SqliteBackend(self.settings.get("database_path", DATABASE_PATH))
+
+        # firebase_admin takes long to import, so it is first loaded here,
+        # once the window is up
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        self.timings.mark("firebase_import")
+        cred_location = self.settings.get("cred_location", "")
+        if not cred_location:
+            raise ValueError("U settings.json nije podešen cred_location.")
+        cred = credentials.Certificate(cred_location)
+        firebase_admin.initialize_app(cred)
+        return FirestoreBackend(firestore.client())
+
+    def on_connected(self, db):
+        self.db = db
+        self.timings.mark("connected")
+        self.writes.set_db(db)
+        # Listeners ask only for changes newer than the cache, and must not
+        # be overwritten by it, so they wait until it is applied
+        if self.cache_loaded:
+            self.start_listeners()
+
+    def start_listeners(self):
+        self.listening = True
+        for item_type in FIELDS:
+            self.listen(item_type)
+        self.init_tombstones()
+        if self.watched_vozilo_id is not None:
+            self.listen_vozilo_servisi(self.watched_vozilo_id)
+        self.timings.mark("listeners")
+
+    def show_connect_error(self, message):
+        self.ui.statusbar.showMessage("Nije povezano sa bazom podataka")
+        QMessageBox.warning(
+            self, "Greška", f"Povezivanje sa bazom podataka nije uspelo.\n{message}"
+        )
+
+    def require_db(self):
+        if self.db is None:
+            QMessageBox.warning(
+                self, "Upozorenje", "Veza sa bazom podataka još nije uspostavljena."
+            )
+        return self.db is not None
+
+    def filter_servisi_by_vozilo(self, selected, deselected):
+        with metrics.timer("filter_servisi"):
+            if selected.indexes():
+                # Get the selected vozilo_id
+                vozilo_id = self.doc_id_at("vozila", selected.indexes()[0])
+
+                # Retrieve corresponding data for the selected vehicle
+                self.fetch_document("vozila", vozilo_id, self.show_vozilo_data)
+
+                # Filter the servisi based on the selected vozilo_id
+                self.servisi_proxy.set_doc_ids(self.servisi_pripada.get(vozilo_id))
+                if self.servisi_days:
+                    self.update_servisi_cutoff()
+                    self.watch_vozilo_servisi(vozilo_id)
+            else:
+                # If no item is selected in tableView_vozila, show all items in tableView_servisi
+                self.reads.cancel("vozila")
+                self.servisi_proxy.set_doc_ids(None)
+                if self.servisi_days:
+                    self.update_servisi_cutoff()
+                    self.watch_vozilo_servisi(None)
+        self.count_rows("servisi")
+        self.show_totals()
+
+    def show_vozilo_data(self, vozilo_data):
+        # Fill line edits with corresponding data
+        self.ui.lineEdit_model.setText(vozilo_data.get("model", ""))
+        self.ui.lineEdit_vrsta.setText(vozilo_data.get("vrsta", ""))
+        self.ui.lineEdit_brojSasija.setText(vozilo_data.get("sasija", ""))
+        self.ui.lineEdit_brojMotor.setText(vozilo_data.get("motor", ""))
+        self.ui.lineEdit_tablice.setText(vozilo_data.get("tablice", ""))
+        self.ui.lineEdit_godiste.setText(str(vozilo_data.get("godiste", "")))
+        self.ui.lineEdit_snaga.setText(str(vozilo_data.get("snaga", "")))
+        self.ui.lineEdit_kubikaza.setText(str(vozilo_data.get("kubikaza", "")))
+
+    def watch_vozilo_servisi(self, vozilo_id):
+        # In scoped mode the full history of one vehicle at a time is listened for
+        if self.vozilo_servisi_listener is not None:
+            self.vozilo_servisi_listener.unsubscribe()
+            self.vozilo_servisi_listener = None
+        if self.watched_vozilo_id is not None:
+            self.evict_servisi(self.watched_vozilo_id)
+        self.watched_vozilo_id = vozilo_id
+        if vozilo_id is not None and self.listening:
+            self.listen_vozilo_servisi(vozilo_id)
+
+    def listen_vozilo_servisi(self, vozilo_id):
+        self.vozilo_servisi_listener = self.db.listen(
+            "servisi",
+            lambda changes, read_time: self.vozilo_snapshot_received.emit(changes),
+            [("pripada", "==", vozilo_id)],
+        )
+
+    def update_vozilo_servisi(self, changes):
+        # A recent service leaving this vehicle's query was moved or deleted,
+        # either way the window listener reports it. Applying the removal here
+        # could drop a service it already moved to another vehicle.
+        store = self.servisi_store
+        changes = [
+            change
+            for change in changes
+            if change[0] != "REMOVED"
+            or self.is_expired_servis(store.documents.get(change[1], {}))
+        ]
+        self.update_table("servisi", changes, None)
+
+    def evict_servisi(self, vozilo_id):
+        # Drop the history outside the recent window once its vehicle is deselected
+        store = self.servisi_store
+        expired = {
+            doc_id
+            for doc_id in self.servisi_pripada.get(vozilo_id)
+            if self.is_expired_servis(store.documents.get(doc_id, {}))
+        }
+        if expired:
+            self.apply_documents("servisi", {}, expired)
+            self.cache.save("servisi", {}, expired)
+
+    def is_expired_servis(self, data):
+        return str(data.get("datum", "")) < self.servisi_cutoff
+
+    def current_servisi_cutoff(self):
+        return QDate.currentDate().addDays(-self.servisi_days).toString(Qt.ISODate)
+
+    def update_servisi_cutoff(self):
+        # A terminal left running for days slides the window forward, drops
+        # the services that fell out of it and listens for the new window
+        cutoff = self.current_servisi_cutoff()
+        if cutoff == self.servisi_cutoff:
+            return
+        self.servisi_cutoff = cutoff
+        expired = {
+            doc_id
+            for doc_id, data in self.servisi_store.documents.items()
+            if self.is_expired_servis(data)
+            and data.get("pripada") != self.watched_vozilo_id
+        }
+        if expired:
+            self.apply_documents("servisi", {}, expired)
+            self.cache.save("servisi", {}, expired)
+        if self.listening:
+            self.servisi_listener.unsubscribe()
+            self.listen("servisi")
+
+    def clear_servis_data(self):
+        self.ui.lineEdit_detaljiServisa.clear()
+        self.ui.lineEdit_kilometraza.clear()
+        self.ui.lineEdit_cena.clear()
+        self.ui.dateEdit_datum.setDate(QDate.currentDate())
+        self.ui.timeEdit_vreme.setTime(QTime.currentTime())
+
+    def load_servis_data(self, selected, deselected):
+        if selected.indexes():
+            doc_id = self.doc_id_at("servisi", selected.indexes()[0])
+            self.fetch_document("servisi", doc_id, self.show_servis_data)
+        else:
+            self.reads.cancel("servisi")
+            self.clear_servis_data()
+
+    def show_servis_data(self, doc_data):
+        self.ui.lineEdit_detaljiServisa.setText(doc_data.get("detalji", ""))
+        self.ui.lineEdit_kilometraza.setText(str(doc_data.get("kilometraza", "")))
+        self.ui.lineEdit_cena.setText(str(doc_data.get("cena", "")))
+        datum = doc_data.get("datum")
+        if datum:
+            self.ui.dateEdit_datum.setDate(QDate.fromString(datum, "yyyy-MM-dd"))
+        vreme = doc_data.get("vreme")
+        if vreme:
+            self.ui.timeEdit_vreme.setTime(QTime.fromString(vreme, "HH:mm:ss"))
+
+    def filter_korisnici(self):
+        with metrics.timer("filter_korisnici"):
+            doc_ids = self.korisnici_search.search(self.ui.lineEdit_pretraga.text())
+            self.korisnici_proxy.set_doc_ids(doc_ids)
+        self.count_rows("korisnici")
+
+    def count_rows(self, item_type):
+        shown = getattr(self, f"{item_type}_proxy").rowCount()
+        metrics.gauge(f"{item_type}_shown", shown)
+        metrics.gauge(
+            f"{item_type}_hidden",
+            getattr(self, f"{item_type}_model").rowCount() - shown,
+        )
+
+    def load_settings(self):
+        self.settings = Settings(SETTINGS_PATH, self)
+
+        # Days of service history kept loaded, 0 loads the whole collection
+        self.servisi_days = self.settings.get("servisi_days", 0)
+
+        # Set font size, credentials are read later by open_database
+        if os.path.exists(SETTINGS_PATH):
+            font_size = self.settings.get("font_size", 12)
+            self.change_font_size(font_size)
+            self.ui.horizontalSlider_font.setValue(font_size)
+
+    def change_font_size(self, font_size):
+        # Changing the application font relayouts every widget, so the
+        # slider only gets here once it has settled
+        app = QApplication.instance()
+        font = app.font()
+        if font.pointSize() != font_size:
+            font.setPointSize(font_size)
+            app.setFont(font)
+        self.update_settings({"font_size": font_size})
+
+    def update_settings(self, new_settings):
+        self.settings.update(new_settings)
+
+    def add_item(self, item_type):
+        selected_user_id = None
+        selected_indexes = self.ui.tableView_korisnici.selectedIndexes()
+        if selected_indexes and item_type == "vozila":
+            selected_user_id = self.doc_id_at("korisnici", selected_indexes[0])
+            print(selected_user_id, "selected")
+        with metrics.timer("dialog_open"):
+            dialog = AddItemDialog(item_type, selected_user_id, self)
+        if dialog.exec() == QDialog.Accepted:
+            data = dialog.data()
+            data[UPDATED_FIELD] = SERVER_TIMESTAMP
+            self.writes.add(item_type, data)
+
+    def add_servis(self):
+        selected_indexes = self.ui.tableView_vozila.selectedIndexes()
+        if selected_indexes:
+            vozilo_id = self.doc_id_at("vozila", selected_indexes[0])
+            detalji = self.ui.lineEdit_detaljiServisa.toPlainText()
+            kilometraza = self.ui.lineEdit_kilometraza.text()
+            cena = self.ui.lineEdit_cena.text()
+            datum = self.ui.dateEdit_datum.date().toString(Qt.ISODate)
+            vreme = self.ui.timeEdit_vreme.time().toString("HH:mm:ss")
+
+            data = {
+                "pripada": vozilo_id,
+                "detalji": detalji,
+                "kilometraza": int(kilometraza) if kilometraza else 0,
+                "cena": float(cena) if cena else 0.0,
+                "datum": datum,  # Separate date
+                "vreme": vreme,  # Separate time
+                UPDATED_FIELD: SERVER_TIMESTAMP,
+            }
+
+            self.writes.add("servisi", data)
+
+            self.clear_servis_data()
+        else:
+            QMessageBox.warning(self, "Upozorenje", "Prvo odaberite vozilo.")
+
+    def update_servis(self):
+        selected_indexes = self.ui.tableView_servisi.selectedIndexes()
+        if selected_indexes:
+            servis_id = self.doc_id_at("servisi", selected_indexes[0])
+            detalji = self.ui.lineEdit_detaljiServisa.toPlainText()
+            kilometraza = self.ui.lineEdit_kilometraza.text()
+            cena = self.ui.lineEdit_cena.text()
+            datum = self.ui.dateEdit_datum.date().toString(Qt.ISODate)
+            vreme = self.ui.timeEdit_vreme.time().toString("HH:mm:ss")
+
+            data = {
+                "detalji": detalji,
+                "kilometraza": int(kilometraza) if kilometraza else 0,
+                "cena": float(cena) if cena else 0.0,
+                "datum": datum,  # Separate date
+                "vreme": vreme,  # Separate time
+                UPDATED_FIELD: SERVER_TIMESTAMP,
+            }
+
+            confirm = QMessageBox.question(
+                self,
+                "Potvrda",
+                "Da li ste sigurni da želite da ažurirate ovaj servis?",
+                QMessageBox.Yes | QMessageBox.No,
+            )
+            if confirm == QMessageBox.Yes:
+                self.writes.update("servisi", servis_id, data)
+        else:
+            QMessageBox.warning(self, "Upozorenje", "Prvo odaberite servis.")
+
+    def delete_item(self, item_type):
+        selected_indexes = getattr(self.ui, f"tableView_{item_type}").selectedIndexes()
+        if selected_indexes:
+            doc_id = self.doc_id_at(item_type, selected_indexes[0])
+
+            # Deleting a customer takes their vehicles along, and deleting a
+            # vehicle takes its services, so no orphans are left behind
+            vozila = set()
+            if item_type == "korisnici":
+                vozila = set(self.vozila_pripada.get(doc_id))
+            elif item_type == "vozila":
+                vozila = {doc_id}
+
+            if self.servisi_days and vozila:
+                if not self.require_db():
+                    return
+                # Scoped mode only holds recent services, ask for the rest
+                self.reads.submit(
+                    "delete",
+                    lambda: self.query_servisi_ids(vozila),
+                    lambda servisi: self.confirm_delete(
+                        item_type, doc_id, vozila, servisi
+                    ),
+                )
+            else:
+                self.confirm_delete(item_type, doc_id, vozila, set())
+
+    def query_servisi_ids(self, vozila):
+        # Runs on the read pool, only the IDs are fetched
+        return {
+            doc_id
+            for doc_id, _ in self.db.stream(
+                "servisi", [("pripada", "in", list(vozila))], fields=[]
+            )
+        }
+
+    def confirm_delete(self, item_type, doc_id, vozila, servisi):
+        servisi = set(servisi).union(*(self.servisi_pripada.get(v) for v in vozila))
+        vozila = vozila - {doc_id}
+        message = "Are you sure you want to delete this item?"
+        if vozila or servisi:
+            message += (
+                f"\nThis also deletes {len(vozila)} vehicles"
+                f" and {len(servisi)} services."
+            )
+        confirm = QMessageBox.question(
+            self,
+            "Confirmation",
+            message,
+            QMessageBox.Yes | QMessageBox.No,
+        )
+        if confirm != QMessageBox.Yes:
+            return
+
+        # Children go first, so an interrupted delete never orphans anything.
+        # Rows leave the tables through the listeners once the deletes are
+        # committed, a failed batch leaves its documents in place.
+        removals = [
+            ("servisi", servisi),
+            ("vozila", vozila),
+            (item_type, {doc_id}),
+        ]
+        writes = self.remove_from_database(removals)
+
+        if len(writes) > 2:
+            self.delete_progress = QProgressDialog(
+                "Brisanje...", None, 0, len(writes), self
+            )
+            self.delete_progress.setWindowTitle("Brisanje")
+            self.delete_progress.setMinimumDuration(0)
+            self.delete_progress.setValue(0)
+
+    def remove_from_database(self, removals):
+        # Every delete is paired with a tombstone, the write queue splits the
+        # group into batches of at most 500 writes
+        writes = []
+        for item_type, doc_ids in removals:
+            for doc_id in doc_ids:
+                tombstone = {
+                    "kolekcija": item_type,
+                    "dokument": doc_id,
+                    UPDATED_FIELD: SERVER_TIMESTAMP,
+                }
+                writes.append(("delete", item_type, doc_id, None))
+                writes.append(("set", TOMBSTONES, f"{item_type}-{doc_id}", tombstone))
+        self.writes.put(writes)
+        return writes
+
+    def show_write_progress(self, pending):
+        progress = self.delete_progress
+        if progress is not None:
+            progress.setValue(max(progress.maximum() - pending, 0))
+            if not pending:
+                progress.close()
+                self.delete_progress = None
+
+        if pending:
+            self.ui.statusbar.showMessage(f"Čuvanje izmena: {pending} na čekanju")
+        else:
+            self.ui.statusbar.showMessage("Sve izmene su sačuvane", 3000)
+
+    def show_write_error(self, message):
+        QMessageBox.warning(
+            self, "Greška", f"Izmena nije sačuvana u bazi podataka.\n{message}"
+        )
+
+    def show_read_error(self, message):
+        self.ui.statusbar.showMessage(f"Greška pri čitanju: {message}", 5000)
+
+    def import_file(self):
+        if self.importer is not None:
+            QMessageBox.warning(self, "Upozorenje", "Uvoz je već u toku.")
+            return
+        if not self.require_db():
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Uvoz", "", "CSV ili JSON (*.csv *.json *.jsonl)"
+        )
+        if not path:
+            return
+        item_type, ok = QInputDialog.getItem(
+            self, "Uvoz", "Kolekcija:", list(FIELDS), 0, False
+        )
+        if not ok:
+            return
+
+        # Vehicles are linked to owners and services to vehicles
+        parents = {"vozila": "korisnici", "servisi": "vozila"}.get(item_type)
+        self.importer = Importer(
+            self.db,
+            path,
+            item_type,
+            FIELDS[item_type],
+            self.field_mapping,
+            CheckpointStore(IMPORTS_PATH),
+            parents=parents and getattr(self, f"{parents}_store").documents,
+            extra={UPDATED_FIELD: SERVER_TIMESTAMP},
+            parent=self,
+        )
+        self.importer.progress.connect(self.show_import_progress)
+        self.importer.finished.connect(self.finish_import)
+        self.importer.failed.connect(self.show_import_error)
+        self.importer.start()
+
+    def show_import_progress(self, count):
+        self.ui.statusbar.showMessage(f"Uvoz: {count} zapisa obrađeno")
+
+    def finish_import(self, imported, skipped):
+        self.importer = None
+        self.ui.statusbar.clearMessage()
+        message = f"Uvezeno zapisa: {imported}"
+        if skipped:
+            message += f"\nPreskočeno zapisa: {skipped}"
+        QMessageBox.information(self, "Uvoz", message)
+
+    def show_import_error(self, message):
+        self.importer = None
+        QMessageBox.warning(
+            self,
+            "Greška",
+            f"Uvoz je prekinut, ponovni uvoz nastavlja gde je stao.\n{message}",
+        )
+
+    def export_servisi(self):
+        if self.exporter is not None:
+            QMessageBox.warning(self, "Upozorenje", "Izvoz je već u toku.")
+            return
+        with metrics.timer("dialog_open"):
+            dialog = ExportDialog(self)
+        if dialog.exec() != QDialog.Accepted:
+            return
+        date_from, date_to, scope = dialog.data()
+
+        vozila = None
+        if scope:
+            item_type = "vozila" if scope == 1 else "korisnici"
+            selected_indexes = getattr(
+                self.ui, f"tableView_{item_type}"
+            ).selectedIndexes()
+            if not selected_indexes:
+                naziv = "vozilo" if scope == 1 else "korisnika"
+                QMessageBox.warning(self, "Upozorenje", f"Prvo odaberite {naziv}.")
+                return
+            doc_id = self.doc_id_at(item_type, selected_indexes[0])
+            vozila = {doc_id} if scope == 1 else set(self.vozila_pripada.get(doc_id))
+
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Izvoz servisa", "servisi.csv", "CSV (*.csv)"
+        )
+        if not path:
+            return
+
+        # The cache holds every service once the full listener has synced in
+        # this session, a cache left from the previous one may be stale
+        cache_path = None
+        if not self.servisi_days and "servisi" in self.synced:
+            cache_path = CACHE_PATH
+        elif not self.require_db():
+            return
+
+        # Vehicle and owner names are resolved up front on the GUI thread
+        korisnici = self.korisnici_store.documents
+        labels = {}
+        for vozilo_id, data in self.vozila_store.documents.items():
+            owner = korisnici.get(data.get("pripada"), {})
+            labels[vozilo_id] = (
+                " ".join(str(data.get(f, "")) for f in ("tablice", "model")).strip(),
+                " ".join(str(owner.get(f, "")) for f in ("ime", "prezime")).strip(),
+            )
+
+        self.exporter = Exporter(
+            self.db,
+            path,
+            labels,
+            date_from,
+            date_to,
+            vozila,
+            cache_path,
+            parent=self,
+        )
+        self.exporter.progress.connect(self.show_export_progress)
+        self.exporter.finished.connect(self.finish_export)
+        self.exporter.failed.connect(self.show_export_error)
+        self.exporter.start()
+
+    def show_export_progress(self, count):
+        self.ui.statusbar.showMessage(f"Izvoz: {count} servisa upisano")
+
+    def finish_export(self, count):
+        self.exporter = None
+        self.ui.statusbar.showMessage(f"Izvezeno servisa: {count}", 5000)
+
+    def show_export_error(self, message):
+        self.exporter = None
+        QMessageBox.warning(self, "Greška", f"Izvoz nije uspeo.\n{message}")
+
+    def closeEvent(self, event):
+        # Without a database queued writes can only be kept by staying open
+        if self.db is None and self.writes.pending:
+            confirm = QMessageBox.question(
+                self,
+                "Potvrda",
+                f"Veza sa bazom podataka nije uspostavljena, {self.writes.pending}"
+                " izmena nije sačuvano i biće izgubljeno. Da li ipak želite da"
+                " zatvorite program?",
+                QMessageBox.Yes | QMessageBox.No,
+            )
+            if confirm != QMessageBox.Yes:
+                event.ignore()
+                return
+
+        # Give queued writes a chance to reach Firestore before exiting
+        if self.importer is not None:
+            self.importer.stop()
+        if self.exporter is not None:
+            self.exporter.stop()
+        self.reads.shutdown()
+        self.writes.close(WRITE_FLUSH_TIMEOUT)
+        if self.db is not None and self.writes.pending:
+            QMessageBox.warning(
+                self,
+                "Upozorenje",
+                f"{self.writes.pending} izmena nije sačuvano u bazi podataka.",
+            )
+        self.settings.save()
+        if self.metrics_log is not None:
+            self.metrics_log.write()
+            self.metrics_log.close()
+        super().closeEvent(event)
+
+    def init_table(self, item_type, headers):
+        # Set up model and headers for table
+        model = DocumentTableModel(
+            FIELDS[item_type], headers, self, SORT_KEYS.get(item_type)
+        )
+        proxy = DocumentFilterProxyModel(self)
+        proxy.setSourceModel(model)
+        table_view = getattr(self.ui, f"tableView_{item_type}")
+        table_view.setModel(proxy)
+        table_view.setEditTriggers(QAbstractItemView.DoubleClicked)
+
+        setattr(self, f"{item_type}_model", model)
+        setattr(self, f"{item_type}_proxy", proxy)
+        setattr(self, f"{item_type}_store", DocumentStore())
+
+        # Connect edited signal to update_database method
+        model.edited.connect(lambda index: self.update_in_database(item_type, index))
+
+        table_view.hideColumn(0)
+        if item_type == "vozila" or item_type == "servisi":
+            table_view.hideColumn(1)
+
+        # Resize columns to stretch
+        table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+    def load_cache(self, steps=None):
+        # Runs from the event loop once the window is painted, the cached
+        # copy is applied a slice at a time so the window stays responsive
+        if steps is None:
+            steps = self.apply_cache()
+        deadline = time.perf_counter() + CACHE_SLICE_MS / 1000
+        while time.perf_counter() < deadline:
+            if next(steps, None) is None:
+                self.cache_loaded = True
+                self.timings.mark("cache")
+                if self.db is not None:
+                    self.start_listeners()
+                return
+        QTimer.singleShot(0, lambda: self.load_cache(steps))
+
+    def apply_cache(self):
+        # Yields after every chunk, listen() later asks only for newer changes
+        for item_type in FIELDS:
+            read_time = self.cache.read_time(item_type)
+            expired = set()
+            for documents, update_times in self.cache.load(item_type, CACHE_CHUNK):
+                if item_type == "servisi" and self.servisi_days:
+                    # Scoped mode: only the recent window is kept, older history
+                    # is listened for per vehicle in watch_vozilo_servisi
+                    for doc_id, data in list(documents.items()):
+                        if self.is_expired_servis(data):
+                            expired.add(doc_id)
+                            del documents[doc_id]
+                            update_times.pop(doc_id, None)
+                self.apply_documents(item_type, documents, set(), update_times)
+                yield item_type
+            if expired:
+                self.cache.save(item_type, {}, expired)
+            if read_time is not None:
+                self.cache_read_times[item_type] = read_time
+
+    def listen(self, item_type):
+        filters = []
+        read_time = self.cache_read_times.get(item_type)
+        if item_type == "servisi" and self.servisi_days:
+            filters.append(("datum", ">=", self.servisi_cutoff))
+        elif read_time is not None:
+            filters.append((UPDATED_FIELD, ">", read_time))
+        listener = self.db.listen(
+            item_type,
+            lambda changes, read_time: self.on_snapshot(item_type, changes, read_time),
+            filters,
+        )
+        setattr(self, f"{item_type}_listener", listener)
+
+    def init_tombstones(self):
+        # Deletions made while this terminal was closed never reach the
+        # filtered listeners, so they are replayed from the tombstones
+        if not self.cache_read_times:
+            return
+        self.tombstones_listener = self.db.listen(
+            TOMBSTONES,
+            lambda changes, read_time: self.on_tombstones(changes),
+            [(UPDATED_FIELD, ">", min(self.cache_read_times.values()))],
+        )
+
+    def on_tombstones(self, changes):
+        batches = {}
+        for change_type, _, data, _ in changes:
+            if change_type == "REMOVED":
+                continue
+            batches.setdefault(data.get("kolekcija"), []).append(
+                ("REMOVED", data.get("dokument"), None, None)
+            )
+        for item_type, batch in batches.items():
+            if item_type in FIELDS:
+                self.snapshot_received.emit(item_type, batch, None)
+
+    def on_snapshot(self, item_type, changes, read_time):
+        # Runs on the listener thread, Qt is touched later on the GUI thread.
+        # Emitted even when empty, the first snapshot marks the table synced.
+        self.snapshot_received.emit(item_type, changes, read_time)
+
+    def update_table(self, item_type, changes, read_time):
+        metrics.observe("snapshot_documents", len(changes), metrics.SIZE_BUCKETS)
+        with metrics.timer("snapshot"):
+            self.apply_snapshot(item_type, changes, read_time)
+
+    def apply_snapshot(self, item_type, changes, read_time):
+        documents = {}
+        update_times = {}
+        removals = set()
+        for change_type, doc_id, data, update_time in changes:
+            if change_type == "REMOVED":
+                documents.pop(doc_id, None)
+                update_times.pop(doc_id, None)
+                removals.add(doc_id)
+            else:
+                removals.discard(doc_id)
+                documents[doc_id] = data
+                update_times[doc_id] = update_time
+        self.apply_documents(item_type, documents, removals, update_times)
+        self.cache.save(item_type, documents, removals, read_time, update_times)
+        if read_time is not None:
+            self.cache_read_times[item_type] = read_time
+        if read_time is not None and item_type not in self.synced:
+            self.synced.add(item_type)
+            self.timings.mark(f"{item_type}_synced")
+            if self.synced == set(FIELDS):
+                elapsed = self.timings.mark("synced")
+                self.timings.save(STARTUP_PATH)
+                self.ui.statusbar.showMessage(
+                    f"Podaci sinhronizovani za {elapsed / 1000:.1f} s", 5000
+                )
+
+    def apply_documents(self, item_type, documents, removals, update_times=None):
+        model = getattr(self, f"{item_type}_model")
+        upserts = {
+            doc_id: self.row_values(item_type, data)
+            for doc_id, data in documents.items()
+        }
+
+        # The pripada index is updated first so the filtered servisi view
+        # picks up new rows for the selected vehicle as they are inserted
+        moved = False
+        if item_type == "servisi":
+            for doc_id in removals:
+                self.servisi_pripada.remove(doc_id)
+                self.servisi_totals.remove(doc_id)
+            for doc_id, data in documents.items():
+                moved |= self.servisi_pripada.update(doc_id, data)
+                self.servisi_totals.update(doc_id, data)
+
+        model.apply_changes(upserts, removals)
+        getattr(self, f"{item_type}_store").apply_changes(
+            documents, removals, update_times
+        )
+
+        if moved:
+            self.servisi_proxy.refresh()
+
+        if item_type == "vozila":
+            for doc_id in removals:
+                self.vozila_pripada.remove(doc_id)
+                self.vozila_keys.remove(doc_id)
+            for doc_id, data in documents.items():
+                self.vozila_pripada.update(doc_id, data)
+                self.vozila_keys.update(doc_id, data)
+
+        if item_type in ("vozila", "servisi"):
+            self.show_totals()
+
+        if item_type == "korisnici":
+            for doc_id in removals:
+                self.korisnici_search.remove(doc_id)
+            for doc_id, data in documents.items():
+                self.korisnici_search.update(doc_id, data)
+            if self.ui.lineEdit_pretraga.text():
+                self.filter_korisnici()
+
+    def fetch_document(self, item_type, doc_id, callback, channel=None):
+        # Served from the listener's copy, a miss is read on the read pool.
+        # A newer fetch on the same channel drops the older result.
+        channel = channel or item_type
+        data = getattr(self, f"{item_type}_store").get(doc_id)
+        if data is not None:
+            self.reads.cancel(channel)
+            callback(data)
+            return
+        if self.db is None:
+            return
+        self.reads.submit(
+            channel,
+            lambda: self.db.get(item_type, doc_id) or {},
+            callback,
+        )
+
+    def doc_id_at(self, item_type, index):
+        # Map a view index through the filter proxy to its document ID
+        proxy = getattr(self, f"{item_type}_proxy")
+        return getattr(self, f"{item_type}_model").doc_id(
+            proxy.mapToSource(index).row()
+        )
+
+    def row_values(self, item_type, data):
+        return [data.get(field, "") for field in FIELDS[item_type]]
+
+    def update_in_database(self, item_type, index):
+        model = getattr(self, f"{item_type}_model")
+        row = index.row()
+        doc_id = model.doc_id(row)
+        field_display_name = model.headerData(index.column(), Qt.Horizontal)
+
+        # Translate displayed name to database field name
+        field_name = self.field_mapping.get(field_display_name, "").lower()
+        if not field_name:
+            return
+
+        new_value = index.data(Qt.DisplayRole)
+
+        # The previous value and the version the edit is based on come from
+        # the listener's copy, nothing is read before writing
+        store = getattr(self, f"{item_type}_store")
+        old_value = (store.get(doc_id) or {}).get(field_name)
+        self.confirm_edit(
+            item_type,
+            doc_id,
+            field_name,
+            old_value,
+            new_value,
+            store.update_times.get(doc_id),
+        )
+
+    def confirm_edit(
+        self, item_type, doc_id, field_name, old_value, new_value, update_time=None
+    ):
+        # Update the value in the database
+        confirm = QMessageBox.question(
+            self,
+            "Potvrda",
+            f"Da li želite da napravite izmenu?\nPrethodna vrednost: {old_value}\nNova vrednost: {new_value}",
+            QMessageBox.Yes | QMessageBox.No,
+        )
+        if confirm == QMessageBox.Yes:
+            # Fails with a conflict if another terminal changed the document
+            # in the meantime, documents without a known update_time are
+            # written unconditionally
+            self.writes.update(
+                item_type,
+                doc_id,
+                {field_name: new_value, UPDATED_FIELD: SERVER_TIMESTAMP},
+                update_time,
+            )
+        else:
+            self.restore_row(item_type, doc_id)
+
+    def show_edit_conflict(self, write):
+        _, item_type, doc_id, data, _ = write
+        store = getattr(self, f"{item_type}_store")
+        current = store.get(doc_id)
+        if current is None:
+            QMessageBox.warning(
+                self,
+                "Sukob izmena",
+                "Izmena nije sačuvana, dokument je u međuvremenu obrisan.",
+            )
+            return
+        field_name = next(field for field in data if field != UPDATED_FIELD)
+        answer = QMessageBox.question(
+            self,
+            "Sukob izmena",
+            "Dokument je u međuvremenu izmenjen na drugom računaru."
+            f"\nTrenutna vrednost: {current.get(field_name)}"
+            f"\nVaša vrednost: {data[field_name]}"
+            "\nDa li želite da sačuvate vašu vrednost?",
+            QMessageBox.Yes | QMessageBox.No,
+        )
+        if answer == QMessageBox.Yes:
+            self.writes.update(item_type, doc_id, data, store.update_times.get(doc_id))
+        else:
+            self.restore_row(item_type, doc_id)
+
+    def restore_row(self, item_type, doc_id):
+        # Puts the stored values back over an edit that was not saved
+        data = getattr(self, f"{item_type}_store").documents.get(doc_id)
+        if data is not None:
+            getattr(self, f"{item_type}_model").apply_changes(
+                {doc_id: self.row_values(item_type, data)}, ()
+            )
+
+
+if __name__ == "__main__":
+    timings = StartupTimings(STARTED)
+    timings.mark("imports")
+    # Set Serbian locale
+    locale = QLocale(QLocale.Serbian, QLocale.Serbia)
+    QLocale.setDefault(locale)
+    app = QtWidgets.QApplication([])
+    window = MainWindow(timings)
+    window.show()
+    # Runs once the event loop has painted the window
+    QTimer.singleShot(0, lambda: timings.mark("shown"))
+    QTimer.singleShot(0, window.connect_database)
+    QTimer.singleShot(0, window.load_cache)
+    app.exec()
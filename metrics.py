@@ -0,0 +1,137 @@
+# metrics.py
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+# Upper bounds of the histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]  # ms
+SIZE_BUCKETS = [1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000]  # documents
+
+LOG_MAX_BYTES = 1 << 20
+LOG_BACKUPS = 5
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the percentile, max for the last
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else 0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": round(self.max, 2),
+            "buckets": dict(zip(map(str, self.buckets + ["inf"]), self.counts)),
+        }
+
+
+class Registry:
+    # Timers, counters and gauges shared by every thread
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def percentile(self, name, fraction):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            return None if histogram is None else histogram.percentile(fraction)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "uptime_s": round(time.time() - self.started),
+                "histograms": {
+                    name: histogram.summary()
+                    for name, histogram in self.histograms.items()
+                },
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+
+registry = Registry()
+observe = registry.observe
+timer = registry.timer
+count = registry.count
+gauge = registry.gauge
+percentile = registry.percentile
+snapshot = registry.snapshot
+
+
+class MetricsLog:
+    # Appends one JSON line with the cumulative metrics per call to write(),
+    # rotating the file so it never grows past LOG_MAX_BYTES * LOG_BACKUPS
+
+    def __init__(self, path, terminal):
+        self.terminal = terminal
+        self.logger = logging.getLogger("stefanpos.metrics")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.handler = RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+        )
+        self.logger.addHandler(self.handler)
+
+    def write(self):
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "terminal": self.terminal,
+            **snapshot(),
+        }
+        self.logger.info(json.dumps(record))
+
+    def close(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
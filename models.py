@@ -0,0 +1,460 @@
+# models.py
+import bisect
+from datetime import datetime
+
+from PySide6.QtCore import (
+    QAbstractItemModel,
+    QAbstractProxyModel,
+    QAbstractTableModel,
+    QIdentityProxyModel,
+    QModelIndex,
+    QPersistentModelIndex,
+    Qt,
+    Signal,
+)
+
+# Batches at least this large are applied with a single model reset
+RESET_THRESHOLD = 200
+# The doc_id -> row map is rebuilt once more than 1/REINDEX_FRACTION of the
+# rows were removed since the last rebuild
+REINDEX_FRACTION = 16
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def numeric_key(value):
+    # Blank or unparsable values sort before every number
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return float("-inf")
+    return value if value == value else float("-inf")
+
+
+def datetime_key(datum, vreme=""):
+    # Seconds since 1970 of "yyyy-MM-dd" and "HH:mm:ss", in local time
+    try:
+        moment = datetime.fromisoformat(f"{datum}T{vreme}" if vreme else str(datum))
+    except (TypeError, ValueError):
+        return float("-inf")
+    return (moment.replace(tzinfo=None) - EPOCH).total_seconds()
+
+
+class DocumentTableModel(QAbstractTableModel):
+    # Emitted only for edits made through the view, not for snapshot updates
+    edited = Signal(QModelIndex)
+
+    def __init__(self, fields, headers, parent=None, sort_keys=None):
+        super().__init__(parent)
+        self.fields = list(fields)
+        self.headers = list(headers)
+        # field -> (function, source fields): the typed key a column sorts
+        # by, computed from the source fields whenever a row is stored
+        self.sort_keys = [
+            (
+                self.fields.index(field),
+                function,
+                [self.fields.index(source) for source in sources],
+            )
+            for field, (function, sources) in (sort_keys or {}).items()
+        ]
+        # Column 0 holds the document ID, the rest one list per field,
+        # followed by one hidden list per sort key
+        self.ids = []
+        self.columns = [[] for _ in self.fields + self.sort_keys]
+        self.key_columns = {
+            column: len(self.fields) + i
+            for i, (column, _, _) in enumerate(self.sort_keys)
+        }
+        # Document ID -> position as of the last rebuild, and the positions
+        # removed since then, sorted. A row is its position less the removed
+        # positions before it, so a removal never walks the rows after it.
+        self.rows = {}
+        self.removed = []
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.fields) + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        row, col = index.row(), index.column()
+        if col == 0:
+            return self.ids[row]
+        value = self.columns[col - 1][row]
+        return "" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            if 0 <= section < len(self.headers):
+                return self.headers[section]
+            return None
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+        if index.column() > 0:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole or index.column() == 0:
+            return False
+        column = self.columns[index.column() - 1]
+        if column[index.row()] == value:
+            return False
+        column[index.row()] = value
+        self._store_keys(index.row())
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.edited.emit(index)
+        return True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not 0 <= column < self.columnCount():
+            return
+        if column - 1 in self.key_columns:
+            # Precomputed floats, compared without any conversion
+            keys = self.columns[self.key_columns[column - 1]]
+        else:
+            keys = self.ids if column == 0 else self.columns[column - 1]
+            keys = [str(key) for key in keys]
+        self.layoutAboutToBeChanged.emit()
+        order_rows = sorted(
+            range(len(self.ids)),
+            key=keys.__getitem__,
+            reverse=order == Qt.DescendingOrder,
+        )
+        self._permute(order_rows)
+        self.layoutChanged.emit()
+
+    def _permute(self, order_rows):
+        # order_rows[new_row] == old_row
+        old_ids = self.ids
+        self.ids = list(map(old_ids.__getitem__, order_rows))
+        self.columns = [
+            list(map(column.__getitem__, order_rows)) for column in self.columns
+        ]
+        self._reindex()
+
+        old_indexes = self.persistentIndexList()
+        new_indexes = [
+            self.index(self.rows[old_ids[index.row()]], index.column())
+            for index in old_indexes
+        ]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+
+    def doc_id(self, row):
+        return self.ids[row]
+
+    def row_of(self, doc_id):
+        position = self.rows.get(doc_id)
+        if position is None or not self.removed:
+            return position
+        return position - bisect.bisect_left(self.removed, position)
+
+    def _reindex(self):
+        self.rows = dict(zip(self.ids, range(len(self.ids))))
+        self.removed = []
+
+    def value(self, row, field):
+        return self.columns[self.fields.index(field)][row]
+
+    def _with_keys(self, values):
+        # Row values followed by their sort keys, stored as one row
+        if not self.sort_keys:
+            return values
+        return list(values) + [
+            function(*(values[source] for source in sources))
+            for _, function, sources in self.sort_keys
+        ]
+
+    def _store_keys(self, row):
+        values = [column[row] for column in self.columns[: len(self.fields)]]
+        for i, (_, function, sources) in enumerate(self.sort_keys):
+            self.columns[len(self.fields) + i][row] = function(
+                *(values[source] for source in sources)
+            )
+
+    def set_row(self, row, values):
+        for column, value in zip(self.columns, values):
+            column[row] = value
+        self.dataChanged.emit(
+            self.index(row, 0), self.index(row, len(self.fields)), [Qt.DisplayRole]
+        )
+
+    def remove_row(self, row):
+        # Rows after the removed one keep their order, so a sorted view stays
+        # sorted
+        self.beginRemoveRows(QModelIndex(), row, row)
+        bisect.insort(self.removed, self.rows.pop(self.ids.pop(row)))
+        for column in self.columns:
+            del column[row]
+        self.endRemoveRows()
+        if len(self.removed) * REINDEX_FRACTION > len(self.ids):
+            self._reindex()
+
+    def apply_changes(self, upserts, removals):
+        # upserts: doc_id -> values, removals: iterable of doc_ids
+        if self.sort_keys:
+            upserts = {
+                doc_id: self._with_keys(values) for doc_id, values in upserts.items()
+            }
+        if len(upserts) + len(removals) >= RESET_THRESHOLD:
+            self._reset_with_changes(upserts, removals)
+            return
+
+        for doc_id in removals:
+            row = self.row_of(doc_id)
+            if row is not None:
+                self.remove_row(row)
+
+        added = []
+        for doc_id, values in upserts.items():
+            row = self.row_of(doc_id)
+            if row is None:
+                added.append((doc_id, values))
+            else:
+                self.set_row(row, values)
+
+        if added:
+            first = len(self.ids)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for doc_id, values in added:
+                self.rows[doc_id] = len(self.ids) + len(self.removed)
+                self.ids.append(doc_id)
+                for column, value in zip(self.columns, values):
+                    column.append(value)
+            self.endInsertRows()
+
+    def _reset_with_changes(self, upserts, removals):
+        self.beginResetModel()
+        removals = set(removals)
+        if removals:
+            keep = [
+                row for row, doc_id in enumerate(self.ids) if doc_id not in removals
+            ]
+            self.ids = [self.ids[row] for row in keep]
+            self.columns = [[column[row] for row in keep] for column in self.columns]
+        self._reindex()
+
+        for doc_id, values in upserts.items():
+            row = self.rows.get(doc_id)
+            if row is None:
+                self.rows[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                for column, value in zip(self.columns, values):
+                    column.append(value)
+            else:
+                for column, value in zip(self.columns, values):
+                    column[row] = value
+        self.endResetModel()
+
+
+class DocumentFilterProxyModel(QAbstractProxyModel):
+    # Shows the rows of a DocumentTableModel whose IDs are in doc_ids, a set
+    # or a dict of doc_id -> rank.
+    # Rows are resolved through the source's doc_id -> row map, so changing
+    # the filter costs time proportional to the matches, not to the table.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.doc_ids = None  # None shows every source row
+        self.source_rows = []  # proxy row -> source row
+        self.proxy_rows = {}  # source row -> proxy row
+        self._saved_indexes = []
+
+    def setSourceModel(self, model):
+        self.beginResetModel()
+        super().setSourceModel(model)
+        model.dataChanged.connect(self._source_data_changed)
+        model.rowsAboutToBeInserted.connect(self._source_rows_about_to_be_inserted)
+        model.rowsInserted.connect(self._source_rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self._source_rows_about_to_be_removed)
+        model.rowsRemoved.connect(self._source_rows_removed)
+        model.layoutAboutToBeChanged.connect(self._begin_layout)
+        model.layoutChanged.connect(self._end_layout)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._source_reset)
+        self._rebuild()
+        self.endResetModel()
+
+    def set_doc_ids(self, doc_ids):
+        if doc_ids is None and self.doc_ids is None:
+            return
+        self._begin_layout()
+        self.doc_ids = doc_ids
+        self._end_layout()
+
+    def refresh(self):
+        # Re-resolve the current filter, e.g. after documents changed owner
+        if self.doc_ids is not None:
+            self._begin_layout()
+            self._end_layout()
+
+    def _rebuild(self):
+        if self.doc_ids is None:
+            self.source_rows = []
+            self.proxy_rows = {}
+            return
+        source = self.sourceModel()
+        rows = (source.row_of(doc_id) for doc_id in self.doc_ids)
+        self.source_rows = sorted(row for row in rows if row is not None)
+        if isinstance(self.doc_ids, dict) and len(set(self.doc_ids.values())) > 1:
+            # Ranked IDs: best rank first, source order within a rank
+            ranks = self.doc_ids
+            self.source_rows.sort(key=lambda row: ranks[source.doc_id(row)])
+        self.proxy_rows = {row: i for i, row in enumerate(self.source_rows)}
+
+    def _begin_layout(self, *args):
+        self.layoutAboutToBeChanged.emit()
+        self._saved_indexes = [
+            (index, QPersistentModelIndex(self.mapToSource(index)))
+            for index in self.persistentIndexList()
+        ]
+
+    def _end_layout(self, *args):
+        self._rebuild()
+        source = self.sourceModel()
+        old_indexes = []
+        new_indexes = []
+        for index, source_index in self._saved_indexes:
+            old_indexes.append(index)
+            if source_index.isValid():
+                new_indexes.append(
+                    self.mapFromSource(
+                        source.index(source_index.row(), source_index.column())
+                    )
+                )
+            else:
+                new_indexes.append(QModelIndex())
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self._saved_indexes = []
+        self.layoutChanged.emit()
+
+    def _source_reset(self):
+        self._rebuild()
+        self.endResetModel()
+
+    def _source_rows_about_to_be_inserted(self, parent, first, last):
+        if self.doc_ids is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+        else:
+            self._begin_layout()
+
+    def _source_rows_inserted(self, parent, first, last):
+        if self.doc_ids is None:
+            self.endInsertRows()
+        else:
+            self._end_layout()
+
+    def _source_rows_about_to_be_removed(self, parent, first, last):
+        if self.doc_ids is None:
+            self.beginRemoveRows(QModelIndex(), first, last)
+        else:
+            self._begin_layout()
+
+    def _source_rows_removed(self, parent, first, last):
+        if self.doc_ids is None:
+            self.endRemoveRows()
+        else:
+            self._end_layout()
+
+    def _source_data_changed(self, top_left, bottom_right, roles=()):
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            if self.doc_ids is not None:
+                row = self.proxy_rows.get(row)
+                if row is None:
+                    continue
+            self.dataChanged.emit(
+                self.index(row, top_left.column()),
+                self.index(row, bottom_right.column()),
+                roles,
+            )
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        row = proxy_index.row()
+        if self.doc_ids is not None:
+            row = self.source_rows[row]
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self.doc_ids is not None:
+            row = self.proxy_rows.get(row)
+            if row is None:
+                return QModelIndex()
+        return self.index(row, source_index.column())
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (
+            0 <= row < self.rowCount() and 0 <= column < self.columnCount()
+        ):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        if index is None:
+            return super().parent()
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        if self.doc_ids is None:
+            return self.sourceModel().rowCount()
+        return len(self.source_rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().columnCount()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal:
+            return self.sourceModel().headerData(section, orientation, role)
+        if role == Qt.DisplayRole:
+            return str(section + 1)
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+
+class DocumentLabelProxyModel(QIdentityProxyModel):
+    # Shows a label built from a few fields in column 0, with the document ID
+    # under Qt.UserRole, so combo boxes and completers can share a live model
+
+    def __init__(self, fields, parent=None):
+        super().__init__(parent)
+        self.fields = list(fields)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and index.column() == 0:
+            source = self.sourceModel()
+            row = self.mapToSource(index).row()
+            if role in (Qt.DisplayRole, Qt.EditRole):
+                return " ".join(str(source.value(row, field)) for field in self.fields)
+            if role == Qt.UserRole:
+                return source.doc_id(row)
+        return super().data(index, role)
+
+    def match(
+        self, start, role, value, hits=1, flags=Qt.MatchStartsWith | Qt.MatchWrap
+    ):
+        # QIdentityProxyModel forwards match() to the source, which has no labels
+        return QAbstractItemModel.match(self, start, role, value, hits, flags)
@@ -0,0 +1,126 @@
+# reports.py
+import numpy as np
+
+from indexes import number
+
+PERIODS = ["dan", "nedelja", "mesec"]
+# Width of one bar of the kilometraža distribution
+KILOMETRAZA_STEP = 25000
+# Readings above this are counted in the last range
+KILOMETRAZA_MAX = 1000000
+
+# Positions of the digits and dashes in a "yyyy-MM-dd" datum
+DIGITS = [0, 1, 2, 3, 5, 6, 8, 9]
+DASHES = [4, 7]
+
+
+def parse_numbers(values):
+    # Numeric text is converted by NumPy, anything else falls back to number()
+    try:
+        array = np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        array = np.fromiter((number(value) for value in values), float, len(values))
+    return np.nan_to_num(array, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def parse_dates(values):
+    # "yyyy-MM-dd" text to datetime64[D] without a Python call per value,
+    # anything that is not a valid date becomes NaT
+    text = np.array(values, dtype="U10")
+    codes = text.view(np.uint32).reshape(len(text), 10).astype(np.int64)
+    digits = codes[:, DIGITS] - ord("0")
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    valid &= (codes[:, DASHES] == ord("-")).all(axis=1)
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    valid &= (month >= 1) & (month <= 12) & (day >= 1)
+
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0)
+    first = months.astype("datetime64[M]").astype("datetime64[D]")
+    dates = first + np.where(valid, day - 1, 0)
+    # Days past the end of the month, like 31.04., would roll over instead
+    valid &= dates.astype("datetime64[M]") == first.astype("datetime64[M]")
+    return np.where(valid, dates, np.datetime64("NaT", "D"))
+
+
+def period_starts(dates, period):
+    if period == "mesec":
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+    if period == "nedelja":
+        # 1970-01-01 was a Thursday, weeks start on Monday
+        days = dates.astype(np.int64)
+        return dates - ((days + 3) % 7).astype("timedelta64[D]")
+    return dates
+
+
+class ServisReport:
+    # cena, kilometraža and datum of the loaded services as arrays. They are
+    # rebuilt only when the store changed since the last query, every query
+    # is then a few vectorized passes over them.
+
+    def __init__(self):
+        self.version = None
+        self.cena = np.empty(0)
+        self.kilometraza = np.empty(0)
+        self.datum = np.empty(0, dtype="datetime64[D]")
+
+    def load(self, store):
+        if store.version == self.version:
+            return
+        documents = list(store.documents.values())
+        self.cena = parse_numbers([data.get("cena") for data in documents])
+        self.kilometraza = parse_numbers(
+            [data.get("kilometraza") for data in documents]
+        )
+        self.datum = parse_dates([str(data.get("datum", "")) for data in documents])
+        self.version = store.version
+
+    def select(self, start, end):
+        # Services dated from start to end, both "yyyy-MM-dd" and inclusive.
+        # NaT never compares true, so undated services are left out.
+        return (self.datum >= np.datetime64(start)) & (self.datum <= np.datetime64(end))
+
+    def summary(self, start, end):
+        selected = self.select(start, end)
+        cena = self.cena[selected]
+        kilometraza = self.kilometraza[selected]
+        count = len(cena)
+        return {
+            "count": count,
+            "prihod": float(cena.sum()),
+            "prosek": float(cena.mean()) if count else 0.0,
+            "medijan": float(np.median(cena)) if count else 0.0,
+            "kilometraza": float(kilometraza.mean()) if count else 0.0,
+        }
+
+    def by_period(self, period, start, end):
+        # One (period start, count, prihod, prosek, average kilometraža) row
+        # per period that has services, oldest first
+        selected = self.select(start, end)
+        keys, groups = np.unique(
+            period_starts(self.datum[selected], period), return_inverse=True
+        )
+        counts = np.bincount(groups, minlength=len(keys))
+        prihod = np.bincount(groups, self.cena[selected], len(keys))
+        kilometraza = np.bincount(groups, self.kilometraza[selected], len(keys))
+        return [
+            (str(key), int(count), float(total), total / count, km / count)
+            for key, count, total, km in zip(
+                keys, counts.tolist(), prihod.tolist(), kilometraza.tolist()
+            )
+        ]
+
+    def kilometraza_distribution(self, start, end, step=KILOMETRAZA_STEP):
+        # (from, to, count) for every step wide kilometraža range up to the
+        # highest one
+        kilometraza = self.kilometraza[self.select(start, end)]
+        if not len(kilometraza):
+            return []
+        counts = np.bincount(
+            np.clip(kilometraza, 0, KILOMETRAZA_MAX - 1).astype(np.int64) // step
+        )
+        return [
+            (index * step, (index + 1) * step, count)
+            for index, count in enumerate(counts.tolist())
+        ]
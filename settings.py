@@ -0,0 +1,57 @@
+# settings.py
+import json
+import os
+
+from PySide6.QtCore import QObject, QTimer
+
+# Quiet period after the last change before settings.json is rewritten
+SAVE_DELAY_MS = 1000
+
+
+def save_json(path, data):
+    # Written next to the target and swapped in, so a crash mid-write
+    # leaves the previous file intact
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump(data, file, indent=4)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+class Settings(QObject):
+    # settings.json held in memory, changes are coalesced into one write
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.values = {}
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                self.values = json.load(file)
+        self.dirty = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(SAVE_DELAY_MS)
+        self.timer.timeout.connect(self.save)
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def update(self, new_settings):
+        changed = {
+            key: value
+            for key, value in new_settings.items()
+            if self.values.get(key) != value
+        }
+        if changed:
+            self.values.update(changed)
+            self.dirty = True
+            self.timer.start()
+
+    def save(self):
+        self.timer.stop()
+        if self.dirty:
+            save_json(self.path, self.values)
+            self.dirty = False
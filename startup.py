@@ -0,0 +1,36 @@
+# startup.py
+import json
+import os
+import time
+from datetime import datetime
+
+from settings import save_json
+
+# Startup runs kept in the history file
+HISTORY_SIZE = 50
+
+
+class StartupTimings:
+    # Milliseconds from process start to each startup phase, appended to a
+    # JSON history so regressions show up between releases
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases = {}
+
+    def mark(self, phase):
+        # Only the first time a phase is reached counts
+        if phase not in self.phases:
+            elapsed = (time.perf_counter() - self.started) * 1000
+            self.phases[phase] = round(elapsed)
+        return self.phases[phase]
+
+    def save(self, path):
+        history = []
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                history = json.load(file)
+        history.append(
+            {"started": datetime.now().isoformat(timespec="seconds"), **self.phases}
+        )
+        save_json(path, history[-HISTORY_SIZE:])
@@ -0,0 +1,31 @@
+# store.py
+import metrics
+
+
+class DocumentStore:
+    # Latest data of every document a collection listener has delivered
+
+    def __init__(self):
+        self.documents = {}
+        # Server update_time of each document, where known, for guarded writes
+        self.update_times = {}
+        # Bumped on every change, for readers that cache derived data
+        self.version = 0
+
+    def apply_changes(self, documents, removals, update_times=None):
+        for doc_id in removals:
+            self.documents.pop(doc_id, None)
+            self.update_times.pop(doc_id, None)
+        self.documents.update(documents)
+        for doc_id, update_time in (update_times or {}).items():
+            if update_time is None:
+                self.update_times.pop(doc_id, None)
+            else:
+                self.update_times[doc_id] = update_time
+        self.version += 1
+
+    def get(self, doc_id):
+        # Counted so the metrics show how often reads are served from here
+        data = self.documents.get(doc_id)
+        metrics.count("store_miss" if data is None else "store_hit")
+        return data
@@ -0,0 +1,193 @@
+# workers.py
+import itertools
+import secrets
+import string
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, Qt, Signal
+
+import metrics
+from backend import ConflictError
+
+# Firestore accepts at most 500 writes in one batch
+MAX_BATCH_WRITES = 500
+MAX_RETRIES = 5
+# Seconds before the first retry, doubled on every further attempt
+RETRY_DELAY = 0.5
+READ_WORKERS = 4
+
+ID_ALPHABET = string.ascii_letters + string.digits
+ID_LENGTH = 20
+
+
+def new_id():
+    # Same shape as Firestore's automatic IDs, generated without a client
+    return "".join(secrets.choice(ID_ALPHABET) for _ in range(ID_LENGTH))
+
+
+def commit_batch(db, writes):
+    # Commits one batch through the backend, retried with backoff on
+    # transient errors
+    delay = RETRY_DELAY
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with metrics.timer("db_commit"):
+                db.commit(writes)
+            metrics.count("db_writes", len(writes))
+            return
+        except db.transient_errors():
+            if attempt == MAX_RETRIES:
+                raise
+            metrics.count("db_retries")
+            time.sleep(delay)
+            delay *= 2
+
+
+def is_guarded(writes):
+    return any(len(write) > 4 for write in writes)
+
+
+class WriteQueue(QObject):
+    # Commits writes on a background thread, grouping whatever is pending into
+    # backend batches. A write is ("set" | "update" | "delete", collection,
+    # doc_id, data) and the writes passed to one put() always share a batch.
+    # Writes queue up until a database is set, e.g. while still connecting.
+    progress = Signal(int)  # writes not yet committed
+    failed = Signal(str)
+    conflicted = Signal(object)  # guarded update that found the document changed
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.groups = deque()
+        self.pending = 0
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, writes):
+        writes = list(writes)
+        if not writes:
+            return
+        with self.condition:
+            self.groups.append(writes)
+            self.pending += len(writes)
+            pending = self.pending
+            self.condition.notify()
+        self.progress.emit(pending)
+
+    def set_db(self, db):
+        with self.condition:
+            self.db = db
+            self.condition.notify()
+
+    def add(self, collection, data):
+        # Document IDs are generated locally, so retrying an add is idempotent
+        doc_id = new_id()
+        self.put([("set", collection, doc_id, data)])
+        return doc_id
+
+    def update(self, collection, doc_id, data, update_time=None):
+        # With update_time the update is only applied if the document still
+        # has it, otherwise conflicted is emitted
+        write = ("update", collection, doc_id, data)
+        if update_time is not None:
+            write += (update_time,)
+        self.put([write])
+
+    def close(self, timeout=None):
+        # Lets the queue drain before the worker thread exits
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join(timeout)
+
+    def _next_writes(self):
+        with self.condition:
+            while (not self.groups or self.db is None) and not self.stopping:
+                self.condition.wait()
+            if not self.groups or self.db is None:
+                return None
+            writes = self.groups.popleft()
+            # A guarded update is committed on its own, so a conflict fails
+            # nothing else
+            if is_guarded(writes):
+                return writes
+            while (
+                self.groups
+                and len(writes) + len(self.groups[0]) <= MAX_BATCH_WRITES
+                and not is_guarded(self.groups[0])
+            ):
+                writes.extend(self.groups.popleft())
+            return writes
+
+    def _run(self):
+        while True:
+            writes = self._next_writes()
+            if writes is None:
+                return
+            # A single oversized group is split into consecutive batches
+            for start in range(0, len(writes), MAX_BATCH_WRITES):
+                chunk = writes[start : start + MAX_BATCH_WRITES]
+                self._commit(chunk)
+                with self.condition:
+                    self.pending -= len(chunk)
+                    pending = self.pending
+                self.progress.emit(pending)
+
+    def _commit(self, writes):
+        try:
+            commit_batch(self.db, writes)
+        except ConflictError:
+            self.conflicted.emit(writes[0])
+        except Exception as error:
+            self.failed.emit(str(error))
+
+
+class ReadExecutor(QObject):
+    # Runs blocking reads on a thread pool and calls back on the GUI thread.
+    # Every read belongs to a channel, and only the newest read of a channel
+    # is delivered, so results for an abandoned selection are dropped.
+    failed = Signal(str)
+    _done = Signal(object, int, object)
+
+    def __init__(self, max_workers=READ_WORKERS, parent=None):
+        super().__init__(parent)
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="read")
+        self.tokens = itertools.count()
+        self.latest = {}  # channel -> token of the newest read
+        self.callbacks = {}  # token -> callback
+        self._done.connect(self._deliver, Qt.QueuedConnection)
+
+    def submit(self, channel, function, callback):
+        token = next(self.tokens)
+        self.latest[channel] = token
+        self.callbacks[token] = callback
+
+        def timed():
+            with metrics.timer("db_read"):
+                return function()
+
+        future = self.pool.submit(timed)
+        future.add_done_callback(lambda future: self._done.emit(channel, token, future))
+
+    def cancel(self, channel):
+        self.latest.pop(channel, None)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _deliver(self, channel, token, future):
+        callback = self.callbacks.pop(token)
+        if self.latest.get(channel) != token or future.cancelled():
+            return
+        del self.latest[channel]
+        error = future.exception()
+        if error is not None:
+            self.failed.emit(str(error))
+        else:
+            callback(future.result())